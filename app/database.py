@@ -1,19 +1,145 @@
-from sqlalchemy import create_engine
+import logging
+import os
+
+from sqlalchemy import Index, create_engine, delete, event, func, inspect, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+logger = logging.getLogger(__name__)
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+# Seconds a SQLite writer waits on the database lock before failing
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 30))
+
+
+def engine_options(url):
+    """
+    Engine keyword arguments for the configured backend.
+    Pool settings come from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
+    and DB_POOL_RECYCLE.
+    """
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}}
+
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer; NORMAL sync is
+        # safe in WAL mode and avoids an fsync per commit
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.close()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def init_db():
+    """
+    Creates missing tables, nullable columns and indexes, and rebuilds
+    indexes whose uniqueness changed. Runs at application startup
+    (DB_CREATE_SCHEMA=1, the default) or once per deployment with
+    `python -m app.database`.
+    """
+    from . import models  # noqa: F401 - register models on Base
+    Base.metadata.create_all(bind=engine)
+
+    # create_all does not alter existing tables; add new nullable columns
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.primary_key:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    )
+                logger.info("Added column %s.%s", table.name, column.name)
+            except Exception as e:
+                logger.warning("Could not add column %s.%s: %s", table.name, column.name, e)
+
+    # create_all skips indexes of tables that already exist, and keeps old
+    # ones of the same name (e.g. the former global unique template_hash)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+        for index in list(table.indexes):
+            previous = existing.get(index.name)
+            if previous is not None and bool(previous["unique"]) == bool(index.unique):
+                continue
+            try:
+                if previous is not None:
+                    index.drop(bind=engine)
+                    logger.info("Dropped index %s to rebuild it (unique=%s)", index.name, index.unique)
+                if index.unique:
+                    _drop_duplicates(table, index)
+                index.create(bind=engine)
+                logger.info("Created index %s", index.name)
+                if f"{index.name}_nonunique" in existing:
+                    with engine.begin() as connection:
+                        connection.exec_driver_sql(f"DROP INDEX {index.name}_nonunique")
+            except Exception as e:
+                logger.error("Could not create index %s: %s", index.name, e)
+                _create_fallback_index(table, index)
+
+def _drop_duplicates(table, index):
+    """
+    Deletes rows repeating the columns of a new unique index, keeping the
+    first (lowest id). The baseline stored one field mapping per widget,
+    so radio groups and repeated fields have several rows per name.
+    """
+    if "id" not in table.c:
+        return
+    columns = list(index.columns)
+    first_ids = select(func.min(table.c.id)).group_by(*columns)
+    with engine.begin() as connection:
+        result = connection.execute(delete(table).where(table.c.id.not_in(first_ids)))
+    if result.rowcount:
+        logger.warning(
+            "Deleted %d duplicate %s rows before creating %s", result.rowcount, table.name, index.name
+        )
+
+def _create_fallback_index(table, index):
+    """
+    A non-unique index on the same columns, so lookups still avoid a table
+    scan when the unique one cannot be built. init_db retries the unique
+    index on every run.
+    """
+    if not index.unique:
+        return
+    fallback = Index(f"{index.name}_nonunique", *index.columns)
+    try:
+        fallback.create(bind=engine, checkfirst=True)
+        logger.warning("Created non-unique index %s instead of %s", fallback.name, index.name)
+    except Exception as e:
+        logger.error("Could not create index %s: %s", fallback.name, e)
+    finally:
+        # Not part of the schema: keep create_all from adding it elsewhere
+        table.indexes.discard(fallback)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+if __name__ == "__main__":
+    init_db()
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds (seconds)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STANDARD_LOG_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line; `extra={...}` fields become top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_LOG_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """
+    Configures the root logger from LOG_LEVEL and LOG_FORMAT (text or json).
+    """
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[handler])
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    In-process stage timings and counters, exported in Prometheus text format.
+    When disabled, span() returns a shared no-op context manager.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [count, sum, bucket counts...]
+        self._collectors = []
+
+    def span(self, stage):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = [0, 0.0] + [0] * len(BUCKETS)
+            stats[0] += 1
+            stats[1] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats[2 + i] += 1
+
+    def drain(self):
+        """
+        Returns and resets the recorded stage timings (used by pool workers
+        to hand their timings back to the parent process).
+        """
+        with self._lock:
+            stages, self._stages = self._stages, {}
+        return stages
+
+    def merge(self, stages):
+        with self._lock:
+            for stage, other in stages.items():
+                stats = self._stages.get(stage)
+                if stats is None:
+                    self._stages[stage] = list(other)
+                else:
+                    for i, value in enumerate(other):
+                        stats[i] += value
+
+    def register_collector(self, collector):
+        """
+        Adds a callable returning {metric_name: value} gauges for /metrics.
+        """
+        self._collectors.append(collector)
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP pdf_service_stage_seconds Time spent per request stage",
+            "# TYPE pdf_service_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = {stage: list(stats) for stage, stats in self._stages.items()}
+        for stage, stats in sorted(stages.items()):
+            for bound, count in zip(BUCKETS, stats[2:]):
+                lines.append(f'pdf_service_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'pdf_service_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats[0]}')
+            lines.append(f'pdf_service_stage_seconds_sum{{stage="{stage}"}} {stats[1]}')
+            lines.append(f'pdf_service_stage_seconds_count{{stage="{stage}"}} {stats[0]}')
+
+        for collector in self._collectors:
+            for name, value in collector().items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") == "1")
@@ -1,17 +1,78 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routers import templates, forms
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .database import init_db
+from .instrumentation import configure_logging, metrics
+from .routers import templates, forms, graph
+from .services import confirmation_service
+from .services.ingest_service import ingest_queue
+from .services.graph_service import value_cache
+from .services.output_cache import output_cache
+from .services.read_model_service import read_models
+from .services.pdf_service import template_cache
+from .services.render_service import render_engine, RenderPoolSaturated, RenderTimeout
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+configure_logging()
+
+metrics.register_collector(lambda: {
+    f"pdf_service_template_cache_{name}": value for name, value in template_cache.stats().items()
+})
+metrics.register_collector(lambda: {
+    f"pdf_service_{name}": value for name, value in render_engine.stats().items()
+})
+metrics.register_collector(lambda: {
+    f"pdf_service_graph_cache_{name}": value for name, value in value_cache.stats().items()
+})
+metrics.register_collector(lambda: {
+    f"pdf_service_{name}": value for name, value in ingest_queue.stats().items()
+})
+metrics.register_collector(lambda: {
+    f"pdf_service_read_model_{name}": value for name, value in read_models.stats().items()
+})
+metrics.register_collector(lambda: {
+    f"pdf_service_output_cache_{name}": value for name, value in output_cache.stats().items()
+})
+if forms.graph_svc.backend is not None:
+    metrics.register_collector(lambda: {
+        f"pdf_service_graph_backend_{name}": value for name, value in forms.graph_svc.backend.stats().items()
+    })
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables (disable when migrations run separately)
+    if os.getenv("DB_CREATE_SCHEMA", "1") == "1":
+        init_db()
+    if confirmation_service.write_behind is not None:
+        confirmation_service.write_behind.start()
+    await ingest_queue.start()
+    yield
+    await ingest_queue.stop()
+    if confirmation_service.write_behind is not None:
+        confirmation_service.write_behind.stop()
+    render_engine.shutdown()
+    await forms.graph_svc.close()
 
 app = FastAPI(
     title="PDF Template Service",
     description="Intelligent PDF form management with GraphDB integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+@app.exception_handler(RenderPoolSaturated)
+async def render_pool_saturated_handler(request: Request, exc: RenderPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Render pool is busy, retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(RenderTimeout)
+async def render_timeout_handler(request: Request, exc: RenderTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +85,7 @@ app.add_middleware(
 # Include routers
 app.include_router(templates.router)
 app.include_router(forms.router)
+app.include_router(graph.router)
 
 @app.get("/")
 def read_root():
@@ -33,10 +95,18 @@ def read_root():
         "docs": "/docs",
         "endpoints": {
             "templates": "/templates",
-            "forms": "/forms"
+            "forms": "/forms",
+            "graph": "/graph"
         }
     }
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Stage timings and cache/pool gauges in Prometheus text format.
+    """
+    return metrics.render_prometheus()
@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class Template(Base):
     __tablename__ = "templates"
+    __table_args__ = (
+        # Duplicate-upload check in create_template
+        Index("ix_templates_tenant_hash", "tenant_id", "template_hash", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(String, index=True)
-    template_hash = Column(String, unique=True, index=True)
+    template_hash = Column(String, index=True)
     template_name = Column(String)
     confirm_threshold = Column(Integer, default=2)
     file_path = Column(String)
@@ -16,6 +20,10 @@ class Template(Base):
 
 class FieldMapping(Base):
     __tablename__ = "field_mappings"
+    __table_args__ = (
+        # Field loads per template and per-field lookups in update_mapping
+        Index("ix_field_mappings_template_field", "template_id", "field_name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     template_id = Column(Integer, ForeignKey("templates.id"))
@@ -24,7 +32,24 @@ class FieldMapping(Base):
     source = Column(String)  # 'graphdb' or 'manual'
     entity_type = Column(String, nullable=True)
     property_name = Column(String, nullable=True)
+    graph_path = Column(String, nullable=True)  # e.g. 'Person-[:CHILD_OF]->Parent'
     confirm_count = Column(Integer, default=0)
     is_locked = Column(Boolean, default=False)
 
     template = relationship("Template", back_populates="fields")
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    tenant_id = Column(String, index=True)
+    template_name = Column(String)
+    template_hash = Column(String)
+    file_path = Column(String)
+    status = Column(String, index=True)  # 'queued', 'running', 'completed' or 'failed'
+    stage = Column(String)  # 'queued', 'extracting', 'planning', 'mapping' or 'done'
+    template_id = Column(Integer, ForeignKey("templates.id"), nullable=True)
+    field_count = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, lazyload
+import itertools
+import logging
 import os
 
 from .. import models, schemas
-from ..database import get_db
-from ..services import pdf_service, graph_service
+from ..database import SessionLocal, get_db
+from ..instrumentation import metrics
+from ..services import (
+    batch_service, confirmation_service, graph_service, pdf_service, read_model_service, render_service
+)
+from ..services.output_cache import output_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/forms",
@@ -13,123 +23,230 @@ router = APIRouter(
 )
 
 # Initialize graph service
-graph_svc = graph_service.GraphService()
+graph_svc = graph_service.AsyncGraphService(cache=graph_service.value_cache)
+
+def load_open_plan(template_id):
+    """
+    Builds (or reads) the open plan on a session of its own, so opens
+    served from the cache never create one.
+    """
+    db = SessionLocal()
+    try:
+        return read_model_service.open_plan(db, template_id)
+    finally:
+        db.close()
 
 @router.post("/open")
-def open_form(
-    request: schemas.FormOpenRequest,
-    db: Session = Depends(get_db)
-):
+async def open_form(request: schemas.FormOpenRequest):
     """
     Open a form and auto-fill locked GraphDB fields.
     Returns auto-filled values and list of manual fields.
+    The field partition comes from the cached open plan; the database is
+    only read when the template changed since the last open.
     """
-    template = db.query(models.Template).filter(
-        models.Template.id == request.template_id
-    ).first()
+    plan = read_model_service.cached_open_plan(request.template_id)
+    if plan is None:
+        plan = await run_in_threadpool(load_open_plan, request.template_id)
     
-    if not template:
+    if not plan:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    print(f"\n📋 Opening form for template: {template.template_name}")
-    
-    # Partition fields
-    locked_graph_fields = []
-    unlocked_graph_fields = []
-    manual_fields = []
-    graph_mappings_to_fetch = []
-    
-    for field in template.fields:
-        if field.source == "manual":
-            manual_fields.append({
-                "field_name": field.field_name,
-                "label_text": field.label_text
-            })
-            
-        elif field.source == "graphdb":
-            if field.is_locked:
-                locked_graph_fields.append(field)
-                graph_mappings_to_fetch.append({
-                    "entity_type": field.entity_type,
-                    "property_name": field.property_name,
-                    "field_name": field.field_name
-                })
-            else:
-                unlocked_graph_fields.append({
-                    "field_name": field.field_name,
-                    "label_text": field.label_text,
-                    "confirm_count": field.confirm_count,
-                    "is_locked": False
-                })
-    
     # Fetch data for locked GraphDB fields
     auto_filled_values = {}
-    if graph_mappings_to_fetch:
-        print(f"🔍 Fetching {len(graph_mappings_to_fetch)} locked fields from GraphDB")
-        auto_filled_values = graph_svc.fetch_values(graph_mappings_to_fetch, request.graph_keys)
-        print(f"✓ Retrieved {len(auto_filled_values)} values")
+    if plan["graph_mappings_to_fetch"]:
+        auto_filled_values = await graph_svc.fetch_values(
+            plan["graph_mappings_to_fetch"], request.graph_keys, plan["graph_fetch_groups"]
+        )
     
-    print(f"  - Locked fields: {len(locked_graph_fields)}")
-    print(f"  - Unlocked fields: {len(unlocked_graph_fields)}")
-    print(f"  - Manual fields: {len(manual_fields)}")
+    logger.info(
+        "Opened form for template %s",
+        plan["template_id"],
+        extra={
+            "locked_fields": len(plan["graph_mappings_to_fetch"]),
+            "unlocked_fields": len(plan["unlocked_graph_fields"]),
+            "manual_fields": len(plan["manual_fields"]),
+            "auto_filled": len(auto_filled_values)
+        }
+    )
     
     return {
-        "template_id": template.id,
-        "template_name": template.template_name,
+        "template_id": plan["template_id"],
+        "template_name": plan["template_name"],
         "auto_filled_values": auto_filled_values,
-        "manual_fields": manual_fields,
-        "unlocked_graph_fields": unlocked_graph_fields
+        "manual_fields": plan["manual_fields"],
+        "unlocked_graph_fields": plan["unlocked_graph_fields"]
     }
 
 @router.post("/submit")
 def submit_form(
     request: schemas.FormSubmitRequest,
+    if_none_match: str = Header(None),
     db: Session = Depends(get_db)
 ):
     """
     Submit form and generate filled PDF.
     Updates confirmation counts and locks fields when threshold is reached.
+    With the output cache enabled, identical submits are served from the
+    cache (or answered 304 for a matching If-None-Match); confirmations
+    are counted either way. They are counted only once the PDF is served,
+    so a submit retried after a 503 is not counted twice.
     """
-    template = db.query(models.Template).filter(
-        models.Template.id == request.template_id
-    ).first()
+    with metrics.span("db_load"):
+        # Confirmations are set-based, so the fields need not be loaded
+        template = db.query(models.Template).options(
+            lazyload(models.Template.fields)
+        ).filter(
+            models.Template.id == request.template_id
+        ).first()
     
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    print(f"\n📝 Submitting form for template: {template.template_name}")
-    
-    # Update confirmation counts for unlocked GraphDB fields
-    for field in template.fields:
-        if field.source == "graphdb" and not field.is_locked:
-            field.confirm_count += 1
-            print(f"  - {field.field_name}: confirm_count = {field.confirm_count}/{template.confirm_threshold}")
-            
-            if field.confirm_count >= template.confirm_threshold:
-                field.is_locked = True
-                print(f"    🔒 Field locked!")
-            
-            db.add(field)
+    try:
+        save_profile = pdf_service.resolve_save_profile(request.save_profile, template.tenant_id)
+        fill_strategy = pdf_service.validate_fill_strategy(request.fill_strategy)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
-    db.commit()
+    headers = {
+        "Content-Disposition": f"attachment; filename=filled_{template.template_name}.pdf"
+    }
+    cache_key = None
+    if output_cache.enabled:
+        cache_key = output_cache.key(
+            template.template_hash,
+            request.final_values,
+            save_profile=save_profile,
+            fill_strategy=fill_strategy
+        )
+        headers["ETag"] = f'"{cache_key}"'
+        if read_model_service.etag_matches(if_none_match, headers["ETag"]):
+            confirmation_service.confirm(db, template)
+            return Response(status_code=304, headers={"ETag": headers["ETag"]})
+        
+        filled_pdf_bytes = output_cache.get(cache_key)
+        if filled_pdf_bytes is not None:
+            confirmation_service.confirm(db, template)
+            return Response(content=filled_pdf_bytes, media_type="application/pdf", headers=headers)
     
     # Fill PDF
     if not os.path.exists(template.file_path):
         raise HTTPException(status_code=500, detail="Template PDF file not found")
     
     try:
-        filled_pdf_bytes = pdf_service.fill_pdf_fields(template.file_path, request.final_values)
-        print(f"✓ PDF filled successfully with {len(request.final_values)} values")
-        
-        return Response(
-            content=filled_pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=filled_{template.template_name}.pdf"
-            }
-        )
+        with metrics.span("render"):
+            filled_pdf_bytes = render_service.render_engine.fill(
+                template.file_path,
+                request.final_values,
+                template_hash=template.template_hash,
+                save_profile=save_profile,
+                fill_strategy=fill_strategy
+            )
+    except (render_service.RenderPoolSaturated, render_service.RenderTimeout):
+        raise
     except Exception as e:
-        import traceback
-        print(f"✗ Error filling PDF: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error filling PDF for template %s", template.id)
         raise HTTPException(status_code=500, detail=f"Error filling PDF: {str(e)}")
+    
+    logger.info("Submitted form for template %s", template.id)
+    confirmation_service.confirm(db, template)
+    
+    if cache_key is not None:
+        output_cache.put(cache_key, filled_pdf_bytes)
+    
+    return Response(
+        content=filled_pdf_bytes,
+        media_type="application/pdf",
+        headers=headers
+    )
+
+@router.post("/submit/batch")
+async def submit_form_batch(
+    request: Request,
+    template_id: int = None,
+    format: str = "zip",
+    save_profile: str = None,
+    fill_strategy: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Fill one template for many records and stream the PDFs back.
+
+    Accepts either a JSON body ({"template_id", "records", "format"}) or an
+    NDJSON body (one final_values object per line, Content-Type
+    application/x-ndjson) with template_id, format, save_profile and
+    fill_strategy as query parameters.
+    Results stream as a ZIP archive or a multipart/mixed body. The batch
+    counts as a single confirmation for the template's unlocked fields,
+    recorded once the render pool has accepted it.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            records = await batch_service.parse_ndjson(request.stream())
+        else:
+            batch = schemas.FormBatchSubmitRequest.model_validate_json(await request.body())
+            template_id, records, format = batch.template_id, batch.records, batch.format
+            save_profile, fill_strategy = batch.save_profile, batch.fill_strategy
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch body: {e}")
+
+    if template_id is None:
+        raise HTTPException(status_code=422, detail="template_id is required")
+    if format not in ("zip", "multipart"):
+        raise HTTPException(status_code=422, detail="format must be 'zip' or 'multipart'")
+    if not records:
+        raise HTTPException(status_code=422, detail="The batch has no records")
+    if not all(isinstance(record, dict) for record in records):
+        raise HTTPException(status_code=422, detail="Each record must be an object of final values")
+
+    def load():
+        template = db.query(models.Template).options(
+            lazyload(models.Template.fields)
+        ).filter(
+            models.Template.id == template_id
+        ).first()
+        if not template:
+            raise HTTPException(status_code=404, detail="Template not found")
+        try:
+            profile = pdf_service.resolve_save_profile(save_profile, template.tenant_id)
+            pdf_service.validate_fill_strategy(fill_strategy)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        logger.info("Batch submit of %d records for template %s", len(records), template.id)
+        return template, profile
+
+    template, profile = await run_in_threadpool(load)
+
+    if not os.path.exists(template.file_path):
+        raise HTTPException(status_code=500, detail="Template PDF file not found")
+
+    results = batch_service.render_batch(
+        render_service.render_engine,
+        template.file_path,
+        records,
+        template_hash=template.template_hash,
+        save_profile=profile,
+        fill_strategy=fill_strategy
+    )
+    # Pull the first result before responding so a saturated pool is a 503,
+    # and before confirming so a retried batch is not counted twice
+    first = await run_in_threadpool(next, results, None)
+    if first is not None:
+        results = itertools.chain([first], results)
+    name_prefix = f"filled_{template.template_name}"
+    await run_in_threadpool(confirmation_service.confirm, db, template)
+
+    if format == "multipart":
+        boundary = batch_service.new_boundary()
+        return StreamingResponse(
+            batch_service.stream_multipart(results, name_prefix, boundary),
+            media_type=f"multipart/mixed; boundary={boundary}"
+        )
+
+    return StreamingResponse(
+        batch_service.stream_zip(results, name_prefix),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={name_prefix}.zip"
+        }
+    )
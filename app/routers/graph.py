@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+import logging
+
+from .. import schemas
+from ..services import graph_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/graph",
+    tags=["graph"],
+)
+
+@router.post("/cache/invalidate")
+def invalidate_graph_cache(request: schemas.GraphCacheInvalidate):
+    """
+    Drop cached graph values for one entity, one entity type, or everything
+    (empty body). Call this after the underlying graph data changes.
+    """
+    count = graph_service.value_cache.invalidate(request.entity_type, request.entity_id)
+    logger.info(
+        "Invalidated %d cached graph values (entity_type=%s, entity_id=%s)",
+        count, request.entity_type, request.entity_id
+    )
+    return {"invalidated": count}
+
+@router.get("/cache/stats")
+def get_graph_cache_stats():
+    """
+    Size and hit rate of the graph value cache.
+    """
+    return graph_service.value_cache.stats()
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 import hashlib
+import logging
 import os
+import tempfile
 
 from .. import models, schemas
 from ..database import get_db
-from ..services import pdf_service, mapping_service
+from ..services import (
+    graph_service, ingest_service, pdf_service, mapping_service, read_model_service, render_service
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/templates",
@@ -15,98 +25,131 @@ router = APIRouter(
 UPLOAD_DIR = "uploaded_pdfs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def get_file_hash(file_bytes):
-    return hashlib.sha256(file_bytes).hexdigest()
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+def spool_upload(fileobj, directory, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copies an upload to a temp file in `directory` chunk by chunk while
+    hashing it, so memory use is bounded by chunk_size.
+    Returns (temp_path, sha256 hex digest)
+    """
+    hasher = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := fileobj.read(chunk_size):
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest()
 
-@router.post("/", response_model=schemas.Template)
+def job_response(job):
+    return schemas.IngestJob(job_id=job["id"], **{k: v for k, v in job.items() if k != "id"})
+
+@router.post("/", response_model=None, status_code=202)
 async def create_template(
     file: UploadFile = File(...),
     template_name: str = Form(None),
     tenant_id: str = Form(...),
+    wait: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Upload a new PDF template.
-    - Extracts fields from the PDF
-    - Auto-suggests GraphDB mappings
-    - Stores template and field mappings
+    - Streams the file to disk and queues an ingest job
+    - The job extracts fields, auto-suggests GraphDB mappings, precomputes
+      the fill plan and stores the template and field mappings
+    Returns the job (poll GET /templates/jobs/{job_id}), or with
+    ?wait=true the finished template.
     """
+    temp_path = None
     try:
-        # Read file content
-        content = await file.read()
-        file_hash = get_file_hash(content)
+        # Stream the upload to disk, hashing as it goes
+        temp_path, file_hash = await run_in_threadpool(spool_upload, file.file, UPLOAD_DIR)
         
         # Check if template already exists
-        existing = db.query(models.Template).filter(
-            models.Template.tenant_id == tenant_id,
-            models.Template.template_hash == file_hash
-        ).first()
+        existing = await run_in_threadpool(
+            lambda: db.query(models.Template).filter(
+                models.Template.tenant_id == tenant_id,
+                models.Template.template_hash == file_hash
+            ).first()
+        )
         
         if existing:
-            print(f"✓ Template already exists: {existing.id}")
-            return existing
+            logger.info("Template already exists: %s", existing.id)
+            if wait:
+                return JSONResponse(jsonable_encoder(schemas.Template.model_validate(existing)))
+            job = await ingest_service.ingest_queue.completed(tenant_id, existing.id)
+            return job_response(job)
             
         # Save PDF file
         file_path = os.path.join(UPLOAD_DIR, f"{file_hash}.pdf")
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        print(f"✓ Saved PDF: {file_path}")
+        os.replace(temp_path, file_path)
+        temp_path = None
         
-        # Extract fields from PDF
-        extracted_fields = pdf_service.extract_fields_from_pdf(content)
-        print(f"✓ Extracted {len(extracted_fields)} fields")
-        
-        # Create template record
-        db_template = models.Template(
-            tenant_id=tenant_id,
-            template_hash=file_hash,
-            template_name=template_name or file.filename,
-            file_path=file_path
+        job = await ingest_service.ingest_queue.submit(
+            tenant_id, template_name or file.filename, file_hash, file_path
         )
-        db.add(db_template)
-        db.commit()
-        db.refresh(db_template)
-        
-        print(f"✓ Created template: {db_template.id}")
-        
-        # Create field mappings with auto-suggestions
-        for field in extracted_fields:
-            source, entity, prop = mapping_service.suggest_mapping(field['label_text'])
-            
-            db_mapping = models.FieldMapping(
-                template_id=db_template.id,
-                field_name=field['field_name'],
-                label_text=field['label_text'],
-                source=source,
-                entity_type=entity,
-                property_name=prop
-            )
-            db.add(db_mapping)
-            print(f"  - {field['field_name']}: {source} ({entity}.{prop if prop else 'N/A'})")
-        
-        db.commit()
-        db.refresh(db_template)
-        
-        print(f"✓ Template created successfully with {len(extracted_fields)} fields")
-        return db_template
-        
+        logger.info("Queued ingest job %s for template %s", job["id"], file_hash)
     except Exception as e:
-        import traceback
         error_msg = f"Error creating template: {str(e)}"
-        print(f"✗ {error_msg}")
-        print(traceback.format_exc())
+        logger.exception(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    if not wait:
+        return job_response(job)
+    
+    job = await ingest_service.ingest_queue.wait(job["id"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=500, detail=f"Error creating template: {job['error']}")
+    template = await run_in_threadpool(
+        lambda: db.query(models.Template).filter(models.Template.id == job["template_id"]).first()
+    )
+    return JSONResponse(jsonable_encoder(schemas.Template.model_validate(template)))
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJob)
+def get_ingest_job(job_id: str):
+    """
+    Status and progress of a template ingest job.
+    """
+    job = ingest_service.ingest_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@router.get("/cache/stats")
+def get_template_cache_stats():
+    """
+    Hit/miss counters and size of the parsed-template cache.
+    Counters are per process: with RENDER_WORKERS > 0 fills are served
+    from each render worker's own cache.
+    """
+    return pdf_service.template_cache.stats()
 
 @router.get("/{template_id}/fields", response_model=schemas.Template)
-def get_template_fields(template_id: int, db: Session = Depends(get_db)):
+def get_template_fields(
+    template_id: int,
+    if_none_match: str = Header(None),
+    db: Session = Depends(get_db)
+):
     """
     Get all fields and their mappings for a template.
+    Served pre-serialized from the read-model cache with an ETag; pollers
+    sending If-None-Match get 304 until the mappings change.
     """
-    template = db.query(models.Template).filter(models.Template.id == template_id).first()
-    if not template:
+    view = read_model_service.template_fields(db, template_id)
+    if not view:
         raise HTTPException(status_code=404, detail="Template not found")
-    return template
+    
+    body, etag = view
+    if read_model_service.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @router.post("/{template_id}/fields/mapping", response_model=schemas.Template)
 def update_mapping(
@@ -116,41 +159,80 @@ def update_mapping(
 ):
     """
     Update field mappings (admin confirms GraphDB vs Manual).
+    A GraphDB field can name a relationship path instead of the suggested
+    mapping, e.g. `Person-[:CHILD_OF]->Parent.address`; it is then fetched
+    with the `person_id` graph key.
     """
     template = db.query(models.Template).filter(models.Template.id == template_id).first()
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
-        
-    for update in mapping_update.fields:
-        field = db.query(models.FieldMapping).filter(
-            models.FieldMapping.template_id == template_id,
-            models.FieldMapping.field_name == update.field_name
-        ).first()
-        
-        if field:
-            if update.source == "manual":
-                field.source = "manual"
-                field.entity_type = None
-                field.property_name = None
-                print(f"✓ Set {field.field_name} to MANUAL")
-                
-            elif update.source == "graphdb":
-                # Re-apply mapping rules
-                _, entity, prop = mapping_service.suggest_mapping(field.label_text)
-                if not entity:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"No GraphDB mapping available for '{field.label_text}'"
-                    )
-                
-                field.source = "graphdb"
-                field.entity_type = entity
-                field.property_name = prop
-                print(f"✓ Set {field.field_name} to GRAPHDB ({entity}.{prop})")
+    
+    # Fields arrive with the template (joined load); index them once
+    fields_by_name = {}
+    for field in template.fields:
+        fields_by_name.setdefault(field.field_name, field)
+    
+    updates = [
+        (change, fields_by_name[change.field_name])
+        for change in mapping_update.fields
+        if change.field_name in fields_by_name
+    ]
+    graph_updates = [
+        field for change, field in updates if change.source == "graphdb" and not change.graph_path
+    ]
+    
+    # Re-apply mapping rules for all GraphDB updates in one batch
+    suggestions = dict(zip(
+        (field.id for field in graph_updates),
+        mapping_service.suggest_mappings(
+            [field.label_text for field in graph_updates], tenant_id=template.tenant_id
+        )
+    ))
+    
+    rows = []
+    for change, field in updates:
+        if change.source == "manual":
+            rows.append({
+                "id": field.id, "source": "manual", "entity_type": None, "property_name": None, "graph_path": None
+            })
+            logger.info("Set %s to MANUAL", field.field_name)
             
-            db.add(field)
+        elif change.source == "graphdb" and change.graph_path:
+            try:
+                anchor, hops, prop = graph_service.parse_path(change.graph_path)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if not prop:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Graph path '{change.graph_path}' must end with a property, e.g. Parent.address"
+                )
             
+            path = graph_service.format_path(anchor, hops)
+            rows.append({
+                "id": field.id, "source": "graphdb", "entity_type": hops[-1][3], "property_name": prop,
+                "graph_path": path
+            })
+            logger.info("Set %s to GRAPHDB (%s.%s)", field.field_name, path, prop)
+            
+        elif change.source == "graphdb":
+            _, entity, prop = suggestions[field.id]
+            if not entity:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"No GraphDB mapping available for '{field.label_text}'"
+                )
+            
+            rows.append({
+                "id": field.id, "source": "graphdb", "entity_type": entity, "property_name": prop, "graph_path": None
+            })
+            logger.info("Set %s to GRAPHDB (%s.%s)", field.field_name, entity, prop)
+    
+    if rows:
+        # ORM bulk UPDATE by primary key: one executemany for all rows
+        db.execute(update(models.FieldMapping), rows)
     db.commit()
+    read_model_service.invalidate(template_id)
     db.refresh(template)
     return template
 
@@ -168,42 +250,25 @@ def diagnose_pdf_fields(template_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Template PDF file not found")
     
     try:
-        import fitz
-        doc = fitz.open(template.file_path)
+        # Large documents are inspected in parallel page ranges
+        total_pages, fields = render_service.render_engine.diagnose(template.file_path)
+        plan = pdf_service.load_fill_plan(template.file_path)
         
         diagnostic_info = {
             "template_id": template_id,
             "template_name": template.template_name,
             "file_path": template.file_path,
-            "total_pages": len(doc),
-            "fields": []
+            "total_pages": total_pages,
+            "fill_strategy": plan.fill_strategy if plan else None,
+            "fields": fields
         }
         
-        for page_num, page in enumerate(doc):
-            widgets = page.widgets()
-            if widgets:
-                for widget in widgets:
-                    field_info = {
-                        "page": page_num + 1,
-                        "field_name": widget.field_name,
-                        "field_type": widget.field_type,
-                        "field_type_string": widget.field_type_string,
-                        "current_value": widget.field_value,
-                        "text_color": widget.text_color,
-                        "text_fontsize": widget.text_fontsize,
-                        "border_color": widget.border_color,
-                        "fill_color": widget.fill_color,
-                    }
-                    diagnostic_info["fields"].append(field_info)
-        
-        doc.close()
-        
         diagnostic_info["total_fields"] = len(diagnostic_info["fields"])
         return diagnostic_info
         
+    except (render_service.RenderPoolSaturated, render_service.RenderTimeout):
+        raise
     except Exception as e:
-        import traceback
-        print(f"✗ Error diagnosing PDF: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error diagnosing PDF")
         raise HTTPException(status_code=500, detail=f"Error diagnosing PDF: {str(e)}")
 
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
@@ -7,6 +8,7 @@ class FieldMappingBase(BaseModel):
     source: str
     entity_type: Optional[str] = None
     property_name: Optional[str] = None
+    graph_path: Optional[str] = None
     confirm_count: int = 0
     is_locked: bool = False
 
@@ -28,9 +30,22 @@ class Template(TemplateBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class IngestJob(BaseModel):
+    job_id: str
+    status: str  # 'queued', 'running', 'completed' or 'failed'
+    stage: Optional[str] = None  # 'queued', 'extracting', 'planning', 'mapping' or 'done'
+    tenant_id: Optional[str] = None
+    template_name: Optional[str] = None
+    template_id: Optional[int] = None
+    field_count: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class FieldUpdate(BaseModel):
     field_name: str
     source: str
+    graph_path: Optional[str] = None  # e.g. 'Person-[:CHILD_OF]->Parent.address'
 
 class MappingUpdate(BaseModel):
     fields: List[FieldUpdate]
@@ -44,3 +59,16 @@ class FormSubmitRequest(BaseModel):
     template_id: int
     graph_keys: dict
     final_values: dict
+    save_profile: Optional[str] = None  # 'fast', 'balanced' or 'compact'
+    fill_strategy: Optional[str] = None  # 'widget', 'overlay', 'flatten' or 'hybrid'
+
+class FormBatchSubmitRequest(BaseModel):
+    template_id: int
+    records: List[dict]
+    format: str = "zip"  # 'zip' or 'multipart'
+    save_profile: Optional[str] = None
+    fill_strategy: Optional[str] = None
+
+class GraphCacheInvalidate(BaseModel):
+    entity_type: Optional[str] = None
+    entity_id: Optional[str] = None
@@ -0,0 +1,142 @@
+import io
+import json
+import time
+import uuid
+import zipfile
+from collections import deque
+
+from . import pdf_service
+from .render_service import RenderPoolSaturated
+
+# Seconds between retries while another client holds every render slot
+SATURATED_POLL_INTERVAL = 0.05
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable sink that hands written bytes back in chunks.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def parse_ndjson(chunks):
+    """
+    Parses an NDJSON body into final_values records as its chunks arrive,
+    skipping blank lines.
+    """
+    records = []
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                records.append(json.loads(line))
+    if pending.strip():
+        records.append(json.loads(pending))
+    return records
+
+
+def render_batch(engine, pdf_path, records, template_hash=None, save_profile="compact", fill_strategy=None):
+    """
+    Fills one template once per record on the render engine.
+
+    Keeps at most a pool's worth of jobs in flight and yields
+    (index, pdf_bytes, error) in record order as jobs complete, so
+    finished outputs can be streamed out without holding the batch.
+    Raises RenderPoolSaturated only if the first record cannot be
+    admitted; later records wait for a free slot, since the response
+    has started by then.
+    """
+    max_in_flight = max(engine.workers, 1) * 2
+    in_flight = deque()
+
+    def collect():
+        index, future = in_flight.popleft()
+        try:
+            return index, future.result(timeout=engine.timeout), None
+        except Exception as e:
+            return index, None, str(e) or e.__class__.__name__
+
+    for index, values in enumerate(records):
+        while True:
+            try:
+                future = engine.submit(
+                    pdf_service.fill_pdf_fields, pdf_path, values, template_hash, save_profile, fill_strategy
+                )
+                break
+            except RenderPoolSaturated:
+                # Shared pool is busy: wait on our own oldest job, or for
+                # other clients' jobs once the batch is under way
+                if in_flight:
+                    yield collect()
+                elif index > 0:
+                    time.sleep(SATURATED_POLL_INTERVAL)
+                else:
+                    raise
+        in_flight.append((index, future))
+
+        while len(in_flight) >= max_in_flight:
+            yield collect()
+
+    while in_flight:
+        yield collect()
+
+
+def stream_zip(results, name_prefix):
+    """
+    Streams rendered results as a ZIP archive, one entry per record.
+    Failed records get a .error.txt entry instead of a PDF.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, pdf_bytes, error in results:
+            if error is None:
+                archive.writestr(f"{name_prefix}_{index:05d}.pdf", pdf_bytes)
+            else:
+                archive.writestr(f"{name_prefix}_{index:05d}.error.txt", error)
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def stream_multipart(results, name_prefix, boundary):
+    """
+    Streams rendered results as a multipart/mixed body.
+    """
+    for index, pdf_bytes, error in results:
+        if error is None:
+            content_type = "application/pdf"
+            filename = f"{name_prefix}_{index:05d}.pdf"
+            body = pdf_bytes
+        else:
+            content_type = "text/plain"
+            filename = f"{name_prefix}_{index:05d}.error.txt"
+            body = error.encode()
+
+        header = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Disposition: attachment; filename={filename}\r\n"
+            f"\r\n"
+        )
+        yield header.encode() + body + b"\r\n"
+
+    yield f"--{boundary}--\r\n".encode()
+
+
+def new_boundary():
+    return uuid.uuid4().hex
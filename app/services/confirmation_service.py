@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import update
+
+from .. import models
+from ..database import SessionLocal
+from ..instrumentation import metrics
+from . import read_model_service
+
+logger = logging.getLogger(__name__)
+
+
+def apply_confirmations(db, template_id, threshold, count=1):
+    """
+    Adds `count` confirmations to every unlocked GraphDB field of a
+    template and locks those reaching the threshold, in one UPDATE.
+    The database evaluates the increment, so concurrent submits never
+    lose counts. Returns the number of fields updated.
+    """
+    field = models.FieldMapping
+    result = db.execute(
+        update(field)
+        .where(
+            field.template_id == template_id,
+            field.source == "graphdb",
+            field.is_locked.isnot(True)
+        )
+        .values(
+            confirm_count=field.confirm_count + count,
+            is_locked=field.confirm_count + count >= threshold
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        # Counts and lock states are part of the cached template views
+        read_model_service.invalidate(template_id)
+    return result.rowcount
+
+
+class ConfirmationBuffer:
+    """
+    Write-behind confirmations: submits are counted in memory per template
+    and flushed as one UPDATE per template every `interval` seconds.
+
+    A flush of N pending confirmations adds N to every field that was still
+    unlocked at flush time, so a field crossing the threshold mid-interval
+    may end up with a count above the threshold; its lock state is the same.
+    """
+
+    def __init__(self, session_factory, interval):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._pending = Counter()
+        self._thresholds = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, template_id, threshold, count=1):
+        with self._lock:
+            self._pending[template_id] += count
+            self._thresholds[template_id] = threshold
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            thresholds = dict(self._thresholds)
+
+        if not pending:
+            return
+
+        # Each template commits on its own; only the failed ones are re-queued
+        failed = Counter()
+        db = self.session_factory()
+        try:
+            for template_id, count in pending.items():
+                try:
+                    apply_confirmations(db, template_id, thresholds[template_id], count)
+                except Exception:
+                    logger.exception("Error flushing confirmations for template %s, re-queueing", template_id)
+                    db.rollback()
+                    failed[template_id] = count
+        finally:
+            db.close()
+
+        if failed:
+            with self._lock:
+                self._pending.update(failed)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="confirmation-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+write_behind = None
+if os.getenv("CONFIRM_WRITE_BEHIND", "0") == "1":
+    write_behind = ConfirmationBuffer(SessionLocal, float(os.getenv("CONFIRM_FLUSH_INTERVAL", 1.0)))
+
+
+def confirm(db, template, count=1):
+    """
+    Records `count` confirmations for a template, immediately or through
+    the write-behind buffer when CONFIRM_WRITE_BEHIND=1.
+    """
+    with metrics.span("confirm"):
+        if write_behind is not None:
+            write_behind.add(template.id, template.confirm_threshold, count)
+        else:
+            apply_confirmations(db, template.id, template.confirm_threshold, count)
@@ -1,80 +1,378 @@
+import functools
+import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 
-class GraphService:
+from ..instrumentation import metrics
+from . import memory_graph
+
+logger = logging.getLogger(__name__)
+
+def driver_config():
     """
-    GraphDB service with mock data fallback.
-    Connects to Neo4j if available, otherwise uses mock data.
+    Connection pool settings shared by the sync and async Neo4j drivers.
+    """
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", 100)),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 60)),
+        "connection_timeout": float(os.getenv("NEO4J_CONNECTION_TIMEOUT", 30)),
+    }
+
+
+class GraphValueCache:
+    """
+    Read-through cache of graph property values keyed by
+    (entity_type, id, property), with a TTL and LRU eviction.
+    Absent properties are cached too, so misses are not re-queried.
+    Values reached over a relationship path are keyed by the path and
+    the id of the node it starts from.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._by_entity = {}  # (entity_type, id) -> set of keys
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(entity_type, entity_id, prop):
+        return (entity_type, str(entity_id), prop)
+
+    def split(self, entities):
+        """
+        Splits grouped entities into cached values and the entities
+        (restricted to uncached properties) that still need a query.
+        Returns (values, to_fetch)
+        """
+        values = {}
+        to_fetch = {}
+        now = time.monotonic()
+
+        with self._lock:
+            for alias, entity in entities.items():
+                missing = []
+                for prop in entity["props"]:
+                    key = self.key(entity["entity_type"], entity["id"], prop)
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[0] > now:
+                        self._entries.move_to_end(key)
+                        values[key] = entry[1]
+                        self.hits += 1
+                    else:
+                        missing.append(prop)
+                        self.misses += 1
+                if missing:
+                    to_fetch[alias] = {**entity, "props": missing}
+
+        return values, to_fetch
+
+    def put_many(self, values):
+        if self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+                self._by_entity.setdefault(key[:2], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                key, _ = self._entries.popitem(last=False)
+                self._forget(key)
+
+    def _forget(self, key):
+        keys = self._by_entity.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_entity[key[:2]]
+
+    def invalidate(self, entity_type=None, entity_id=None):
+        """
+        Drops cached values for one entity, one entity type, or everything.
+        Paths through the entity type are dropped for every start node,
+        since the node they reach is not known.
+        Returns the number of values dropped.
+        """
+        with self._lock:
+            if entity_type is None and entity_id is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._by_entity.clear()
+                return count
+
+            if entity_type is not None and entity_id is not None:
+                groups = [(entity_type, str(entity_id))]
+            else:
+                groups = [
+                    group for group in self._by_entity
+                    if (entity_type is None or group[0] == entity_type)
+                    and (entity_id is None or group[1] == str(entity_id))
+                ]
+            if entity_type is not None:
+                groups = set(groups) | {
+                    group for group in self._by_entity if entity_type in _path_labels(group[0])
+                }
+
+            count = 0
+            for group in groups:
+                for key in self._by_entity.pop(group, ()):
+                    self._entries.pop(key, None)
+                    count += 1
+            return count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# A relationship path from a keyed node, e.g. Person-[:CHILD_OF]->Parent.address
+_NAME = r"[A-Za-z_][A-Za-z0-9_]*"
+_HOP = re.compile(rf"(<-|-)\[:({_NAME})\](->|-)({_NAME})")
+_PATH = re.compile(rf"({_NAME})((?:(?:<-|-)\[:{_NAME}\](?:->|-){_NAME})+)(?:\.({_NAME}))?")
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_path(path):
+    """
+    Parses a relationship path such as `Person-[:CHILD_OF]->Parent.address`.
+    The property is optional. Names are restricted to identifiers since
+    they end up in the Cypher text.
+
+    Returns:
+        (anchor label, ((left arrow, relationship, right arrow, label), ...), property or None)
+    """
+    match = _PATH.fullmatch(path.replace(" ", ""))
+    if not match:
+        raise ValueError(f"Invalid graph path '{path}'")
+    hops = tuple(_HOP.findall(match.group(2)))
+    if any(left == "<-" and right == "->" for left, _, right, _ in hops):
+        raise ValueError(f"Invalid graph path '{path}': relationship with two directions")
+    return match.group(1), hops, match.group(3)
+
+
+def format_path(anchor, hops):
+    """
+    Canonical text of a parsed path, without the property.
+    """
+    return anchor + "".join(f"{left}[:{rel}]{right}{label}" for left, rel, right, label in hops)
+
+
+def _path_labels(entity_type):
     """
-    
-    def __init__(self):
-        self.driver = None
+    Labels along a cached path entity, or an empty tuple for a plain label.
+    """
+    if "[" not in entity_type:
+        return ()
+    anchor, hops, _ = parse_path(entity_type)
+    return (anchor,) + tuple(label for _, _, _, label in hops)
+
+
+value_cache = GraphValueCache(
+    max_entries=int(os.getenv("GRAPH_CACHE_MAX_ENTRIES", 100000)),
+    ttl=float(os.getenv("GRAPH_CACHE_TTL", 60)),
+)
+
+
+def group_mappings(mappings):
+    """
+    Groups mappings by (entity_type, key) so each node is matched once.
+    A mapping with a graph_path (e.g. `Person-[:CHILD_OF]->Parent`) is
+    keyed by the node the path starts from and grouped per path.
+    Independent of the graph keys, so it can be computed once per template.
+
+    Returns:
+        list of {"entity_type", "key_field", "anchor", "hops", "props", "fields"}
+    """
+    groups = {}
+
+    for m in mappings:
+        entity_type = m.get('entity_type')
+        prop_name = m.get('property_name')
+        field_name = m.get('field_name')
+
+        if not entity_type or not prop_name:
+            continue
+
+        anchor, hops = entity_type, ()
+        if m.get('graph_path'):
+            try:
+                anchor, hops, _ = parse_path(m['graph_path'])
+            except ValueError as e:
+                logger.warning("Skipping %s: %s", field_name, e)
+                continue
+            entity_type = format_path(anchor, hops)
+
+        # The key to look up in graph_keys
+        key_field = f"{anchor.lower()}_id"
+
+        group = groups.setdefault((entity_type, key_field), {
+            "entity_type": entity_type,
+            "key_field": key_field,
+            "anchor": anchor,
+            "hops": hops,
+            "props": [],
+            "fields": []
+        })
+        if prop_name not in group["props"]:
+            group["props"].append(prop_name)
+        group["fields"].append((field_name, prop_name))
+
+    return list(groups.values())
+
+
+class _GraphServiceBase:
+    """
+    Query building, result unpacking and mock data shared by the sync and
+    async services.
+
+    A backend (e.g. a MemoryGraph) answers the batched lookups in place of
+    Neo4j; GRAPH_BACKEND=memory uses the graph loaded from GRAPH_FIXTURE.
+    """
+
+    def __init__(self, driver=None, cache=None, backend=None):
+        self.driver = driver
+        self.cache = cache
+        self.backend = backend
+        timeout = os.getenv("NEO4J_QUERY_TIMEOUT")
+        self.query_timeout = float(timeout) if timeout else None
+        if driver is None and backend is None and os.getenv("GRAPH_BACKEND", "neo4j") == "memory":
+            self.backend = memory_graph.shared_graph()
+        if driver is not None or self.backend is not None:
+            return
+
         # Try to import and connect to Neo4j
         try:
-            from neo4j import GraphDatabase
             uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
             user = os.getenv("NEO4J_USER", "neo4j")
             password = os.getenv("NEO4J_PASSWORD", "password")
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
-            print("✓ Connected to Neo4j")
+            self.driver = self._create_driver(uri, (user, password))
+            logger.info("Neo4j driver created for %s", uri)
         except Exception as e:
-            print(f"⚠ Neo4j not available, using mock data: {e}")
+            logger.warning("Neo4j not available, using mock data: %s", e)
             self.driver = None
 
-    def close(self):
-        if self.driver:
-            self.driver.close()
+    def _create_driver(self, uri, auth):
+        raise NotImplementedError
 
-    def fetch_values(self, mappings, graph_keys):
+    def _query(self, text):
         """
-        Fetch values from GraphDB or mock data.
-        
-        Args:
-            mappings: list of dicts with entity_type, property_name, field_name
-            graph_keys: dict of {key_name: id_value}
-        
-        Returns:
-            dict of {field_name: value}
+        Wraps the query text with the configured server-side timeout.
         """
-        if not self.driver:
-            return self._get_mock_data(mappings)
+        if self.query_timeout is None:
+            return text
+        from neo4j import Query
+        return Query(text, timeout=self.query_timeout)
 
+    def _plan_fetch(self, mappings, graph_keys, groups=None):
+        """
+        Groups mappings by entity and serves what it can from the cache.
+        Returns (entities, cached values, entities still to query)
+        """
+        entities = self._bind_groups(
+            groups if groups is not None else group_mappings(mappings), graph_keys
+        )
+        if self.cache is None or not entities:
+            return entities, {}, entities
+        values, to_fetch = self.cache.split(entities)
+        return entities, values, to_fetch
+
+    def _read_record(self, entities, record):
+        """
+        Returns {(entity_type, id, property): value} for every queried property.
+        """
+        values = {}
+        for alias, entity in entities.items():
+            props = (record[alias] if record else None) or {}
+            for prop_name in entity["props"]:
+                key = GraphValueCache.key(entity["entity_type"], entity["id"], prop_name)
+                values[key] = props.get(prop_name)
+        if self.cache is not None:
+            self.cache.put_many(values)
+        return values
+
+    def _resolve(self, entities, values):
         results = {}
-        
-        try:
-            with self.driver.session() as session:
-                for m in mappings:
-                    entity_type = m.get('entity_type')
-                    prop_name = m.get('property_name')
-                    field_name = m.get('field_name')
-                    
-                    if not entity_type or not prop_name:
-                        continue
-                    
-                    # Determine the key to use from graph_keys
-                    key_field = f"{entity_type.lower()}_id"
-                    if key_field not in graph_keys:
-                        continue
-                        
-                    id_value = graph_keys[key_field]
-                    
-                    # Query Neo4j
-                    query = f"MATCH (n:{entity_type} {{id: $id}}) RETURN n.{prop_name} as val"
-                    result = session.run(query, id=id_value)
-                    record = result.single()
-                    
-                    if record and record["val"]:
-                        results[field_name] = record["val"]
-        except Exception as e:
-            print(f"Error querying Neo4j: {e}")
-            return self._get_mock_data(mappings)
-                    
+        for entity in entities.values():
+            for field_name, prop_name in entity["fields"]:
+                value = values.get(GraphValueCache.key(entity["entity_type"], entity["id"], prop_name))
+                if value:
+                    results[field_name] = value
         return results
 
+    def _bind_groups(self, groups, graph_keys):
+        """
+        Attaches the id from graph_keys to each entity group, skipping
+        entities without a key.
+
+        Returns:
+            dict of {alias: {"entity_type", "id", "anchor", "hops", "props", "fields"}}
+        """
+        entities = {}
+        for group in groups:
+            if group["key_field"] not in graph_keys:
+                continue
+            entities[f"e{len(entities)}"] = {
+                "entity_type": group["entity_type"],
+                "id": graph_keys[group["key_field"]],
+                "anchor": group["anchor"],
+                "hops": group["hops"],
+                "props": group["props"],
+                "fields": group["fields"]
+            }
+        return entities
+
+    def _build_batch_query(self, entities):
+        """
+        Builds a single Cypher query fetching every needed property of every
+        entity, so a form costs one round-trip regardless of its field count.
+        Each keyed node is matched once; entities behind a relationship path
+        are projected from it with a pattern comprehension (first match).
+        """
+        matches = []
+        returns = []
+        params = {}
+        anchors = {}  # (label, id) -> alias of the matched node
+
+        for alias, entity in entities.items():
+            node = anchors.get((entity["anchor"], entity["id"]))
+            if node is None:
+                node = anchors[(entity["anchor"], entity["id"])] = f"n{len(anchors)}"
+                params[f"{node}_id"] = entity["id"]
+                matches.append(f"OPTIONAL MATCH ({node}:{entity['anchor']} {{id: ${node}_id}})")
+
+            projection = ", ".join(f".{prop}" for prop in entity["props"])
+            if not entity["hops"]:
+                returns.append(f"{node} {{{projection}}} AS {alias}")
+                continue
+
+            pattern = f"({node})"
+            for i, (left, rel, right, label) in enumerate(entity["hops"], 1):
+                target = "t" if i == len(entity["hops"]) else ""
+                pattern += f"{left}[:{rel}]{right}({target}:{label})"
+            returns.append(f"head([{pattern} | t {{{projection}}}]) AS {alias}")
+
+        query = "\n".join(matches) + "\nRETURN " + ", ".join(returns)
+        return query, params
+
     def _get_mock_data(self, mappings):
         """
         Returns mock data for testing without Neo4j.
         """
-        print("📊 Using mock GraphDB data")
+        logger.debug("Using mock GraphDB data")
         results = {}
         
         for m in mappings:
@@ -108,3 +406,101 @@ class GraphService:
                     results[field_name] = 'EMP-2024-001'
                     
         return results
+
+
+class GraphService(_GraphServiceBase):
+    """
+    GraphDB service with mock data fallback.
+    Connects to Neo4j if available (or uses the configured backend),
+    otherwise uses mock data.
+    Pass a GraphValueCache to serve repeated lookups without a query.
+    """
+
+    def _create_driver(self, uri, auth):
+        from neo4j import GraphDatabase
+        return GraphDatabase.driver(uri, auth=auth, **driver_config())
+
+    def close(self):
+        if self.driver:
+            self.driver.close()
+
+    def fetch_values(self, mappings, graph_keys, groups=None):
+        """
+        Fetch values from GraphDB or mock data.
+        
+        Args:
+            mappings: list of dicts with entity_type, property_name, field_name
+                and optionally graph_path
+            graph_keys: dict of {key_name: id_value}
+            groups: group_mappings(mappings), when precomputed
+        
+        Returns:
+            dict of {field_name: value}
+        """
+        if not self.driver and self.backend is None:
+            return self._get_mock_data(mappings)
+
+        entities, values, to_fetch = self._plan_fetch(mappings, graph_keys, groups)
+
+        if to_fetch and self.backend is not None:
+            with metrics.span("graph_fetch"):
+                values.update(self._read_record(to_fetch, self.backend.fetch(to_fetch)))
+
+        elif to_fetch:
+            query, params = self._build_batch_query(to_fetch)
+
+            try:
+                with metrics.span("graph_fetch"), self.driver.session() as session:
+                    record = session.run(self._query(query), params).single()
+            except Exception as e:
+                logger.error("Error querying Neo4j: %s", e)
+                return self._get_mock_data(mappings)
+
+            values.update(self._read_record(to_fetch, record))
+
+        return self._resolve(entities, values)
+
+
+class AsyncGraphService(_GraphServiceBase):
+    """
+    GraphDB service on the neo4j async driver, for async request handlers.
+    Same mapping semantics, caching and mock fallback as GraphService.
+    """
+
+    def _create_driver(self, uri, auth):
+        from neo4j import AsyncGraphDatabase
+        return AsyncGraphDatabase.driver(uri, auth=auth, **driver_config())
+
+    async def close(self):
+        if self.driver:
+            await self.driver.close()
+
+    async def fetch_values(self, mappings, graph_keys, groups=None):
+        """
+        Fetch values from GraphDB or mock data without blocking the event loop.
+        Returns dict of {field_name: value}
+        """
+        if not self.driver and self.backend is None:
+            return self._get_mock_data(mappings)
+
+        entities, values, to_fetch = self._plan_fetch(mappings, graph_keys, groups)
+
+        if to_fetch and self.backend is not None:
+            with metrics.span("graph_fetch"):
+                values.update(self._read_record(to_fetch, await self.backend.fetch_async(to_fetch)))
+
+        elif to_fetch:
+            query, params = self._build_batch_query(to_fetch)
+
+            try:
+                with metrics.span("graph_fetch"):
+                    async with self.driver.session() as session:
+                        result = await session.run(self._query(query), params)
+                        record = await result.single()
+            except Exception as e:
+                logger.error("Error querying Neo4j: %s", e)
+                return self._get_mock_data(mappings)
+
+            values.update(self._read_record(to_fetch, record))
+
+        return self._resolve(entities, values)
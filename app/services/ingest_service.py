@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from .. import models
+from ..database import SessionLocal
+from ..instrumentation import metrics
+from . import mapping_service, pdf_service, read_model_service, render_service
+
+logger = logging.getLogger(__name__)
+
+JOB_FIELDS = (
+    "id", "tenant_id", "template_name", "template_hash", "file_path", "status", "stage",
+    "template_id", "field_count", "error", "created_at", "updated_at",
+)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class MemoryJobStore:
+    """
+    Keeps ingest jobs in process memory; the oldest finished jobs are
+    dropped beyond `retention` entries. Jobs are lost on restart.
+    """
+
+    def __init__(self, retention=1000):
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, **job):
+        job = {field: job.get(field) for field in JOB_FIELDS}
+        job["created_at"] = job["updated_at"] = _now()
+        with self._lock:
+            self._jobs[job["id"]] = job
+            finished = [
+                job_id for job_id, entry in self._jobs.items()
+                if entry["status"] in ("completed", "failed")
+            ]
+            for job_id in finished[:max(len(self._jobs) - self.retention, 0)]:
+                del self._jobs[job_id]
+        return dict(job)
+
+    def update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes, updated_at=_now())
+            return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def pending(self):
+        return []
+
+
+class DatabaseJobStore:
+    """
+    Persists ingest jobs in the ingest_jobs table, so queued and
+    interrupted jobs are picked up again after a restart.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _as_dict(row):
+        return {field: getattr(row, field) for field in JOB_FIELDS}
+
+    def create(self, **job):
+        db = self.session_factory()
+        try:
+            row = models.IngestJob(**{field: job.get(field) for field in JOB_FIELDS})
+            row.created_at = row.updated_at = _now()
+            db.add(row)
+            db.commit()
+            return self._as_dict(row)
+        finally:
+            db.close()
+
+    def update(self, job_id, **changes):
+        db = self.session_factory()
+        try:
+            row = db.get(models.IngestJob, job_id)
+            for field, value in changes.items():
+                setattr(row, field, value)
+            row.updated_at = _now()
+            db.commit()
+            return self._as_dict(row)
+        finally:
+            db.close()
+
+    def get(self, job_id):
+        db = self.session_factory()
+        try:
+            row = db.get(models.IngestJob, job_id)
+            return self._as_dict(row) if row is not None else None
+        finally:
+            db.close()
+
+    def pending(self):
+        db = self.session_factory()
+        try:
+            rows = db.query(models.IngestJob).filter(
+                models.IngestJob.status.in_(("queued", "running"))
+            ).order_by(models.IngestJob.created_at).all()
+            return [self._as_dict(row) for row in rows]
+        finally:
+            db.close()
+
+
+def unique_fields(extracted_fields):
+    """
+    Widgets sharing a name (e.g. repeated on several pages) are one
+    field; keeps the first, field names are unique per template.
+    """
+    seen = set()
+    return [
+        field for field in extracted_fields
+        if not (field['field_name'] in seen or seen.add(field['field_name']))
+    ]
+
+
+def _existing_template_id(db, job):
+    existing = db.query(models.Template.id).filter(
+        models.Template.tenant_id == job["tenant_id"],
+        models.Template.template_hash == job["template_hash"]
+    ).first()
+    return existing.id if existing else None
+
+
+def store_template(db, job, extracted_fields):
+    """
+    Creates the template and all its suggested field mappings in one
+    transaction, the mappings with a single bulk INSERT.
+    Returns the template id.
+    """
+    # A concurrent job may have ingested the same file for this tenant
+    existing_id = _existing_template_id(db, job)
+    if existing_id is not None:
+        return existing_id
+
+    try:
+        return _insert_template(db, job, extracted_fields)
+    except IntegrityError:
+        # Lost the race on (tenant_id, template_hash): use the winner's template
+        db.rollback()
+        existing_id = _existing_template_id(db, job)
+        if existing_id is None:
+            raise
+        logger.info("Template %s was stored by a concurrent job", job["template_hash"])
+        return existing_id
+
+
+def _insert_template(db, job, extracted_fields):
+    db_template = models.Template(
+        tenant_id=job["tenant_id"],
+        template_hash=job["template_hash"],
+        template_name=job["template_name"],
+        file_path=job["file_path"]
+    )
+    db.add(db_template)
+    db.flush()
+
+    suggestions = mapping_service.suggest_mappings(
+        [field['label_text'] for field in extracted_fields],
+        tenant_id=job["tenant_id"]
+    )
+    rows = [
+        {
+            "template_id": db_template.id,
+            "field_name": field['field_name'],
+            "label_text": field['label_text'],
+            "source": source,
+            "entity_type": entity,
+            "property_name": prop,
+            "confirm_count": 0,
+            "is_locked": False,
+        }
+        for field, (source, entity, prop) in zip(extracted_fields, suggestions)
+    ]
+    if rows:
+        db.execute(insert(models.FieldMapping), rows)
+    db.commit()
+    read_model_service.invalidate(db_template.id)
+    return db_template.id
+
+
+class IngestQueue:
+    """
+    Runs template ingest (field extraction, fill plan, mapping suggestion
+    and storage) on `workers` background tasks, so uploads return as soon
+    as the file is on disk. Progress is recorded in the job store.
+    """
+
+    def __init__(self, store, workers, session_factory=SessionLocal):
+        self.store = store
+        self.workers = workers
+        self.session_factory = session_factory
+        self._queue = None
+        self._tasks = []
+        self._done = {}  # job id -> asyncio.Event, for callers waiting on a job
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self.store.pending):
+            logger.info("Resuming ingest job %s", job["id"])
+            self._enqueue(job["id"])
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingest-{i}") for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job_id):
+        self._done.setdefault(job_id, asyncio.Event())
+        self._queue.put_nowait(job_id)
+
+    async def submit(self, tenant_id, template_name, template_hash, file_path):
+        """
+        Records a queued job for a template file already saved on disk.
+        Returns the job.
+        """
+        job = await asyncio.to_thread(
+            self.store.create,
+            id=uuid.uuid4().hex,
+            tenant_id=tenant_id,
+            template_name=template_name,
+            template_hash=template_hash,
+            file_path=file_path,
+            status="queued",
+            stage="queued"
+        )
+        self._enqueue(job["id"])
+        return job
+
+    async def completed(self, tenant_id, template_id):
+        """
+        Records an already finished job, for uploads of existing templates.
+        """
+        return await asyncio.to_thread(
+            self.store.create,
+            id=uuid.uuid4().hex,
+            tenant_id=tenant_id,
+            status="completed",
+            stage="done",
+            template_id=template_id
+        )
+
+    async def wait(self, job_id):
+        """
+        Waits for a job submitted to this process to finish. Returns the job.
+        """
+        event = self._done.get(job_id)
+        if event is not None:
+            await event.wait()
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    async def _update(self, job_id, **changes):
+        return await asyncio.to_thread(self.store.update, job_id, **changes)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ingest job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id):
+        job = await self._update(job_id, status="running", stage="extracting")
+        try:
+            with metrics.span("ingest"):
+                with metrics.span("extract"):
+                    extracted_fields = unique_fields(
+                        await render_service.render_engine.extract(job["file_path"])
+                    )
+
+                # Store the fill plan next to the PDF; if this fails it is
+                # built on the first fill instead
+                await self._update(job_id, stage="planning")
+                try:
+                    fill_strategy = await render_service.render_engine.run_async(
+                        pdf_service.write_fill_plan, job["file_path"]
+                    )
+                    logger.info(
+                        "Template %s will be filled with the %s strategy", job["template_hash"], fill_strategy
+                    )
+                except Exception as e:
+                    logger.warning("Fill plan not precomputed for %s: %s", job["template_hash"], e)
+
+                await self._update(job_id, stage="mapping", field_count=len(extracted_fields))
+                template_id = await asyncio.to_thread(self._store, job, extracted_fields)
+
+        except render_service.RenderPoolSaturated as e:
+            # The pool is busy with interactive work: back off and retry
+            logger.info("Render pool busy, ingest job %s retries in %ss", job_id, e.retry_after)
+            await self._update(job_id, status="queued", stage="queued")
+            await asyncio.sleep(e.retry_after)
+            self._queue.put_nowait(job_id)
+            return
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job_id)
+            await self._update(job_id, status="failed", error=str(e) or e.__class__.__name__)
+        else:
+            await self._update(job_id, status="completed", stage="done", template_id=template_id)
+            logger.info(
+                "Created template %s with %d fields", template_id, len(extracted_fields)
+            )
+
+        event = self._done.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _store(self, job, extracted_fields):
+        db = self.session_factory()
+        try:
+            return store_template(db, job, extracted_fields)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            "ingest_workers": self.workers,
+            "ingest_jobs_queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+def _create_store():
+    if os.getenv("INGEST_JOB_STORE", "memory") == "db":
+        return DatabaseJobStore(SessionLocal)
+    return MemoryJobStore(int(os.getenv("INGEST_JOB_RETENTION", 1000)))
+
+
+ingest_queue = IngestQueue(_create_store(), workers=int(os.getenv("INGEST_WORKERS", 2)))
@@ -1,38 +1,160 @@
-def suggest_mapping(label_text):
+import json
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Default mapping rules: label pattern -> (entity_type, property_name)
+DEFAULT_RULES = {
+    "ID NUMBER": ("Person", "id_number"),
+    "ID NO": ("Person", "id_number"),
+    "FIRST NAME": ("Person", "first_name"),
+    "LAST NAME": ("Person", "last_name"),
+    "SURNAME": ("Person", "last_name"),
+    "EMAIL": ("Person", "email"),
+    "EMAIL ADDRESS": ("Person", "email"),
+    "PHONE": ("Person", "phone"),
+    "PHONE NUMBER": ("Person", "phone"),
+    "MOBILE": ("Person", "phone"),
+    "ADDRESS": ("Person", "address"),
+    "STREET ADDRESS": ("Person", "address"),
+    "PARENT ADDRESS": ("Parent", "address"),
+    "PARENT NAME": ("Parent", "name"),
+    "EMPLOYEE ID": ("Employee", "employee_id"),
+    "EMPLOYEE NUMBER": ("Employee", "employee_id"),
+}
+
+
+class LabelMatcher:
+    """
+    Aho-Corasick automaton over rule patterns.
+    Finds the longest rule contained in a label in a single pass.
+    """
+
+    def __init__(self, rules):
+        self.rules = {key.upper().strip(): value for key, value in rules.items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._longest = [None]  # longest rule key ending at each state
+
+        for key in self.rules:
+            self._add(key)
+        self._link()
+
+    def _add(self, key):
+        state = 0
+        for ch in key:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._longest.append(None)
+            state = next_state
+        self._longest[state] = key
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                if self._longest[child] is None:
+                    self._longest[child] = self._longest[self._fail[child]]
+
+    def match(self, label_text):
+        """
+        Returns (source, entity_type, property_name) for a label.
+        Exact matches win, otherwise the longest contained rule.
+        """
+        label = label_text.upper().strip()
+
+        # Check for exact matches first
+        if label in self.rules:
+            entity, prop = self.rules[label]
+            return "graphdb", entity, prop
+
+        # Check for partial matches, most specific rule wins
+        best = None
+        state = 0
+        for ch in label:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            key = self._longest[state]
+            if key and (best is None or len(key) > len(best)):
+                best = key
+
+        if best:
+            entity, prop = self.rules[best]
+            return "graphdb", entity, prop
+
+        return "manual", None, None
+
+
+_default_matcher = LabelMatcher(DEFAULT_RULES)
+_tenant_matchers = {}
+
+
+def load_tenant_rules(tenant_id, rules):
+    """
+    Compiles tenant-specific rules on top of the defaults.
+    Tenant rules override defaults with the same pattern.
+    """
+    _tenant_matchers[tenant_id] = LabelMatcher({**DEFAULT_RULES, **rules})
+
+
+def load_rules_dir(directory):
+    """
+    Loads one rules file per tenant from a directory: {tenant_id}.json
+    holding {"LABEL PATTERN": ["EntityType", "property_name"], ...}.
+    Returns the number of tenants loaded.
+    """
+    loaded = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        tenant_id = name[:-len(".json")]
+        try:
+            with open(os.path.join(directory, name)) as f:
+                rules = {pattern: tuple(target) for pattern, target in json.load(f).items()}
+            if any(len(target) != 2 for target in rules.values()):
+                raise ValueError("each rule must map to [entity_type, property_name]")
+        except (OSError, ValueError, TypeError) as e:
+            logger.error("Skipping mapping rules for tenant %s: %s", tenant_id, e)
+            continue
+        load_tenant_rules(tenant_id, rules)
+        loaded += 1
+    logger.info("Loaded mapping rules for %d tenants from %s", loaded, directory)
+    return loaded
+
+
+if os.getenv("MAPPING_RULES_DIR"):
+    load_rules_dir(os.getenv("MAPPING_RULES_DIR"))
+
+
+def get_matcher(tenant_id=None):
+    return _tenant_matchers.get(tenant_id, _default_matcher)
+
+
+def suggest_mapping(label_text, tenant_id=None):
     """
     Suggests entity_type and property_name based on label text.
     Returns (source, entity_type, property_name)
     """
-    label = label_text.upper().strip()
-    
-    # Mapping rules
-    rules = {
-        "ID NUMBER": ("Person", "id_number"),
-        "ID NO": ("Person", "id_number"),
-        "FIRST NAME": ("Person", "first_name"),
-        "LAST NAME": ("Person", "last_name"),
-        "SURNAME": ("Person", "last_name"),
-        "EMAIL": ("Person", "email"),
-        "EMAIL ADDRESS": ("Person", "email"),
-        "PHONE": ("Person", "phone"),
-        "PHONE NUMBER": ("Person", "phone"),
-        "MOBILE": ("Person", "phone"),
-        "ADDRESS": ("Person", "address"),
-        "STREET ADDRESS": ("Person", "address"),
-        "PARENT ADDRESS": ("Parent", "address"),
-        "PARENT NAME": ("Parent", "name"),
-        "EMPLOYEE ID": ("Employee", "employee_id"),
-        "EMPLOYEE NUMBER": ("Employee", "employee_id"),
-    }
-    
-    # Check for exact matches first
-    if label in rules:
-        entity, prop = rules[label]
-        return "graphdb", entity, prop
-    
-    # Check for partial matches
-    for key, (entity, prop) in rules.items():
-        if key in label:
-            return "graphdb", entity, prop
-            
-    return "manual", None, None
+    return get_matcher(tenant_id).match(label_text)
+
+
+def suggest_mappings(labels, tenant_id=None):
+    """
+    Batch version of suggest_mapping.
+    Returns a list of (source, entity_type, property_name) in label order.
+    """
+    matcher = get_matcher(tenant_id)
+    return [matcher.match(label) for label in labels]
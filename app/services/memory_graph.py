@@ -0,0 +1,203 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fixture columns that are not node properties
+NODE_FIELDS = ("label", "id")
+RELATIONSHIP_FIELDS = ("start_label", "start_id", "type", "end_label", "end_id")
+
+
+class NodeTable:
+    """
+    Nodes of one label stored column-wise: an id -> row index plus one
+    list per property, so millions of nodes cost no per-node dicts.
+    """
+
+    def __init__(self):
+        self.rows = {}  # id -> row number
+        self.columns = {}  # property -> list of values, None where unset
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, node_id, props):
+        node_id = str(node_id)
+        row = self.rows.get(node_id)
+        if row is None:
+            row = self.rows[node_id] = len(self.rows)
+            for column in self.columns.values():
+                column.append(None)
+        for prop, value in props.items():
+            column = self.columns.get(prop)
+            if column is None:
+                column = self.columns[prop] = [None] * len(self.rows)
+            column[row] = value
+        return row
+
+    def project(self, row, props):
+        return {prop: self.columns[prop][row] if prop in self.columns else None for prop in props}
+
+
+class MemoryGraph:
+    """
+    In-memory stand-in for Neo4j, for load testing /forms/open without a
+    database. Nodes are indexed by (label, id); relationships are kept as
+    adjacency lists per (label, type, direction).
+
+    Serves the same entity groups GraphService would send to Neo4j,
+    including relationship paths, after `latency` seconds per query.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queries = 0
+        self.relationships = 0
+        self._tables = {}  # label -> NodeTable
+        self._edges = {}  # (label, type, 'out' or 'in') -> {row: [(label, row)]}
+        self._lock = threading.Lock()
+
+    def add_node(self, label, node_id, **props):
+        return self._tables.setdefault(label, NodeTable()).add(node_id, props)
+
+    def add_relationship(self, start_label, start_id, rel_type, end_label, end_id):
+        start = self._row(start_label, start_id)
+        end = self._row(end_label, end_id)
+        if start is None or end is None:
+            raise KeyError(f"Unknown node in {start_label}:{start_id}-[:{rel_type}]->{end_label}:{end_id}")
+        self._edges.setdefault((start_label, rel_type, "out"), {}).setdefault(start, []).append((end_label, end))
+        self._edges.setdefault((end_label, rel_type, "in"), {}).setdefault(end, []).append((start_label, start))
+        self.relationships += 1
+
+    def _row(self, label, node_id):
+        table = self._tables.get(label)
+        return table.rows.get(str(node_id)) if table is not None else None
+
+    def load(self, path):
+        """
+        Loads nodes and relationships from a fixture file:
+
+        - JSON: {"nodes": [{"label", "id", ...properties}],
+          "relationships": [{"start_label", "start_id", "type", "end_label", "end_id"}]}
+        - CSV with a `label,id,...` header: one node per row, the other
+          columns are properties (empty cells are unset)
+        - CSV with a `start_label,start_id,type,end_label,end_id` header:
+          one relationship per row
+
+        Load node files before the relationship files that use them.
+        """
+        start = time.perf_counter()
+        nodes = relationships = 0
+
+        if path.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+            for node in data.get("nodes", []):
+                self.add_node(node["label"], node["id"], **{
+                    key: value for key, value in node.items() if key not in NODE_FIELDS
+                })
+                nodes += 1
+            for rel in data.get("relationships", []):
+                self.add_relationship(*(rel[field] for field in RELATIONSHIP_FIELDS))
+                relationships += 1
+
+        else:
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                if tuple(header) == RELATIONSHIP_FIELDS:
+                    for row in reader:
+                        self.add_relationship(*row)
+                        relationships += 1
+                elif tuple(header[:2]) == NODE_FIELDS:
+                    props = header[2:]
+                    for row in reader:
+                        self.add_node(row[0], row[1], **{
+                            prop: value for prop, value in zip(props, row[2:]) if value != ""
+                        })
+                        nodes += 1
+                else:
+                    raise ValueError(f"Unrecognized graph fixture header in {path}: {header}")
+
+        logger.info(
+            "Loaded %d nodes and %d relationships from %s in %.1fs",
+            nodes, relationships, path, time.perf_counter() - start
+        )
+
+    def _follow(self, label, row, hops):
+        """
+        Walks a relationship path from a node. Returns the (label, row)
+        of the first node reached, or None.
+        """
+        frontier = [(label, row)]
+        for left, rel_type, right, next_label in hops:
+            directions = ("out", "in") if left == right == "-" else ("in",) if left == "<-" else ("out",)
+            reached = []
+            for node_label, node_row in frontier:
+                for direction in directions:
+                    for target in self._edges.get((node_label, rel_type, direction), {}).get(node_row, ()):
+                        if target[0] == next_label:
+                            reached.append(target)
+            if not reached:
+                return None
+            frontier = reached
+        return frontier[0]
+
+    def lookup(self, entities):
+        """
+        Answers a GraphService batch: {alias: properties or None} for
+        entities as built by _bind_groups.
+        """
+        with self._lock:
+            self.queries += 1
+        record = {}
+        for alias, entity in entities.items():
+            label, row = entity["anchor"], self._row(entity["anchor"], entity["id"])
+            if row is not None and entity["hops"]:
+                node = self._follow(label, row, entity["hops"])
+                label, row = node if node is not None else (None, None)
+            record[alias] = self._tables[label].project(row, entity["props"]) if row is not None else None
+        return record
+
+    def fetch(self, entities):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.lookup(entities)
+
+    async def fetch_async(self, entities):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.lookup(entities)
+
+    def stats(self):
+        return {
+            "labels": len(self._tables),
+            "nodes": sum(len(table) for table in self._tables.values()),
+            "relationships": self.relationships,
+            "latency_seconds": self.latency,
+            "queries": self.queries,
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_graph():
+    """
+    The process-wide graph loaded from GRAPH_FIXTURE (comma-separated
+    files), with GRAPH_LATENCY_MS of injected latency per query.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            graph = MemoryGraph(latency=float(os.getenv("GRAPH_LATENCY_MS", 0)) / 1000)
+            for path in filter(None, os.getenv("GRAPH_FIXTURE", "").split(",")):
+                graph.load(path.strip())
+            _shared = graph
+        return _shared
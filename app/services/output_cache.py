@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class OutputCache:
+    """
+    Disk-backed LRU cache of filled PDFs, keyed by a hash of the template,
+    the submitted values and the render options. Identical submits share
+    one entry; the key doubles as the response ETag.
+
+    Entries live as {key}.pdf files in `directory`; total size is bounded
+    by `max_bytes` (0 disables the cache). The LRU order is rebuilt from
+    file modification times at startup and hits touch their file.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()  # key -> size in bytes
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(template_hash, values, **options):
+        """
+        Content address of a fill. Values are compared as the strings they
+        render to, so {"age": 7} and {"age": "7"} share an entry.
+        """
+        canonical = json.dumps(
+            {
+                "template": template_hash,
+                "values": {name: str(value) for name, value in values.items()},
+                "options": options,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pdf"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    def get(self, key):
+        """
+        Returns the cached PDF bytes, or None.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._size -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not store cached output %s: %s", key, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+output_cache = OutputCache(
+    directory=os.getenv("OUTPUT_CACHE_DIR", "output_cache"),
+    max_bytes=int(os.getenv("OUTPUT_CACHE_MAX_BYTES", 0)),
+)
@@ -1,128 +1,554 @@
 import fitz  # PyMuPDF
+import json
+import logging
 import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
 
-def extract_fields_from_pdf(pdf_bytes):
+from ..instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# Location and appearance of a single widget inside a template, with the
+# font size and text baseline used to fill it already resolved
+WidgetRef = namedtuple(
+    "WidgetRef", ["page", "seq", "xref", "field_name", "rect", "fontsize", "field_type", "baseline"]
+)
+
+CachedTemplate = namedtuple("CachedTemplate", ["pdf_bytes", "widget_index", "size", "fill_strategy"])
+
+# Everything a fill needs to know about a template besides its bytes
+FillPlan = namedtuple("FillPlan", ["widget_index", "fill_strategy"])
+
+# Rough per-widget overhead of an index entry, used for cache accounting
+WIDGET_REF_BYTES = 256
+
+# Font size for widgets that do not define one
+DEFAULT_FONTSIZE = 10
+
+# Bumped whenever the fill plan layout changes; older sidecars are rebuilt
+FILL_PLAN_VERSION = 2
+
+# How values are written into a template:
+#   widget  - set field values and regenerate widget appearances
+#   overlay - draw the text onto the page, leave the widgets untouched
+#   flatten - as widget, then bake the widgets into the page content
+#   hybrid  - widget and overlay together
+FILL_STRATEGIES = ("widget", "overlay", "flatten", "hybrid")
+
+# Text widgets probed per template when choosing a fill strategy
+STRATEGY_SAMPLE_WIDGETS = 50
+
+
+def build_widget_index(doc):
     """
-    Extracts fields and attempts to find their labels.
+    Walks every page once and indexes widgets by field name.
+    Returns dict of {field_name: [WidgetRef, ...]}
+    """
+    index = {}
+    seq = 0
+    for page_num, page in enumerate(doc):
+        for widget in page.widgets() or []:
+            if not widget.field_name:
+                continue
+            rect = widget.rect
+            fontsize = widget.text_fontsize or DEFAULT_FONTSIZE
+            index.setdefault(widget.field_name, []).append(WidgetRef(
+                page=page_num,
+                seq=seq,
+                xref=widget.xref,
+                field_name=widget.field_name,
+                rect=tuple(rect),
+                fontsize=fontsize,
+                field_type=widget.field_type,
+                # Small left padding, vertically centred in the field
+                baseline=(rect.x0 + 2, rect.y0 + (rect.height / 2) + (fontsize / 3))
+            ))
+            seq += 1
+    return index
+
+
+def fill_plan_path(pdf_path):
+    """
+    The fill plan is stored next to the template: {hash}.pdf -> {hash}.plan.json
+    """
+    return os.path.splitext(pdf_path)[0] + ".plan.json"
+
+
+def choose_fill_strategy(doc, widget_index):
+    """
+    Probes a sample of text widgets: sets a value and checks that an
+    appearance stream gets generated. Returns "widget" when all of them
+    render, "overlay" when none do and "hybrid" when only some do.
+    Modifies the document, so callers must not save it afterwards.
+    """
+    refs = sorted(
+        (ref for refs in widget_index.values() for ref in refs
+         if ref.field_type == fitz.PDF_WIDGET_TYPE_TEXT),
+        key=lambda ref: ref.seq
+    )[:STRATEGY_SAMPLE_WIDGETS]
+
+    rendered = 0
+    for ref in refs:
+        try:
+            # Keep the page referenced while its widget is in use
+            page = doc[ref.page]
+            widget = page.load_widget(ref.xref)
+            widget.field_value = "Sample 123"
+            widget.text_fontsize = ref.fontsize
+            widget.update()
+            if doc.xref_get_key(ref.xref, "AP/N")[0] == "xref":
+                rendered += 1
+        except Exception as e:
+            logger.debug("Widget %r does not render: %s", ref.field_name, e)
+
+    if rendered == len(refs):
+        return "widget"
+    if rendered == 0:
+        return "overlay"
+    return "hybrid"
+
+
+def build_fill_plan(source):
+    """
+    Indexes a template's widgets and picks its fill strategy.
+    """
+    doc = open_document(source)
+    try:
+        index = build_widget_index(doc)
+        return FillPlan(index, choose_fill_strategy(doc, index))
+    finally:
+        doc.close()
+
+
+def save_fill_plan(pdf_path, plan):
+    data = {
+        "version": FILL_PLAN_VERSION,
+        "fill_strategy": plan.fill_strategy,
+        "fields": {
+            field_name: [list(ref) for ref in refs]
+            for field_name, refs in plan.widget_index.items()
+        },
+    }
+    path = fill_plan_path(pdf_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_fill_plan(pdf_path):
+    """
+    Returns the stored FillPlan of a template, or None when there is no
+    usable fill plan.
+    """
+    try:
+        with open(fill_plan_path(pdf_path)) as f:
+            data = json.load(f)
+        if data.get("version") != FILL_PLAN_VERSION:
+            return None
+        index = {
+            field_name: [
+                WidgetRef(page, seq, xref, name, tuple(rect), fontsize, field_type, tuple(baseline))
+                for page, seq, xref, name, rect, fontsize, field_type, baseline in refs
+            ]
+            for field_name, refs in data["fields"].items()
+        }
+        return FillPlan(index, data["fill_strategy"])
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring unreadable fill plan for %s: %s", pdf_path, e)
+        return None
+
+
+def write_fill_plan(pdf_path):
+    """
+    Builds and stores the fill plan of a template file (run at upload).
+    Returns the chosen fill strategy.
+    """
+    plan = build_fill_plan(pdf_path)
+    save_fill_plan(pdf_path, plan)
+    return plan.fill_strategy
+
+
+class TemplateCache:
+    """
+    LRU cache of template PDF bytes and their widget index, keyed by
+    template hash. Templates are immutable, so entries never go stale;
+    eviction is driven by the total cached byte size.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template_hash, pdf_path):
+        with self._lock:
+            entry = self._entries.get(template_hash)
+            if entry is not None:
+                self._entries.move_to_end(template_hash)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._load(pdf_path)
+
+        with self._lock:
+            if entry.size <= self.max_bytes and template_hash not in self._entries:
+                self._entries[template_hash] = entry
+                self._size += entry.size
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= evicted.size
+                    self.evictions += 1
+        return entry
+
+    def _load(self, pdf_path):
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        plan = load_fill_plan(pdf_path)
+        if plan is None:
+            # Template predates fill plans: build and store it once
+            plan = build_fill_plan(pdf_bytes)
+            try:
+                save_fill_plan(pdf_path, plan)
+            except OSError as e:
+                logger.warning("Could not store fill plan for %s: %s", pdf_path, e)
+        index = plan.widget_index
+        widget_count = sum(len(refs) for refs in index.values())
+        size = len(pdf_bytes) + widget_count * WIDGET_REF_BYTES
+        return CachedTemplate(pdf_bytes, index, size, plan.fill_strategy)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+template_cache = TemplateCache(int(os.getenv("TEMPLATE_CACHE_MAX_BYTES", 256 * 1024 * 1024)))
+
+# Output save settings, from cheapest to smallest output
+SAVE_PROFILES = {
+    "fast": {},  # Write objects as-is: no garbage collection or recompression
+    "balanced": {"garbage": 1, "clean": True, "use_objstms": 1},  # Drop unused objects, pack small ones
+    "compact": {"garbage": 4, "deflate": True, "clean": True},  # Deduplicate and clean
+}
+
+DEFAULT_SAVE_PROFILE = os.getenv("PDF_SAVE_PROFILE", "compact")
+
+# Per-tenant defaults, e.g. PDF_TENANT_SAVE_PROFILES="tenant_a:fast,tenant_b:balanced"
+TENANT_SAVE_PROFILES = dict(
+    entry.split(":", 1) for entry in os.getenv("PDF_TENANT_SAVE_PROFILES", "").split(",") if ":" in entry
+)
+
+
+def save_document(doc, save_profile="compact"):
+    """
+    Serializes a document with the given save profile.
+    Writes through MuPDF's native file output into a temp file: tobytes()
+    streams through a Python callback per chunk, which dominates the cost
+    of saving large, lightly compressed documents.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        doc.save(tmp_path, **SAVE_PROFILES[save_profile])
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+def resolve_save_profile(requested=None, tenant_id=None):
+    """
+    Picks the save profile: explicit request, then tenant default, then global default.
+    Raises ValueError for unknown profile names.
+    """
+    profile = requested or TENANT_SAVE_PROFILES.get(tenant_id) or DEFAULT_SAVE_PROFILE
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile '{profile}', expected one of {list(SAVE_PROFILES)}")
+    return profile
+
+def validate_fill_strategy(requested=None):
+    """
+    Checks a per-request fill strategy override; None keeps the
+    template's own strategy. Raises ValueError for unknown names.
+    """
+    if requested is not None and requested not in FILL_STRATEGIES:
+        raise ValueError(f"Unknown fill strategy '{requested}', expected one of {list(FILL_STRATEGIES)}")
+    return requested
+
+# Label search geometry (points): the strip left of a widget, then the
+# strip above it. Words are bucketed into square grid cells of this size.
+LABEL_SEARCH_LEFT = float(os.getenv("LABEL_SEARCH_LEFT", 150))
+LABEL_SEARCH_ABOVE = float(os.getenv("LABEL_SEARCH_ABOVE", 20))
+LABEL_GRID_CELL = float(os.getenv("LABEL_GRID_CELL", 50))
+
+
+class WordIndex:
+    """
+    Grid index over a page's words, built from one get_text("words") pass.
+    A word belongs to the cell holding its centre, so a region query only
+    visits the cells the region overlaps.
+    """
+
+    def __init__(self, words, cell_size=LABEL_GRID_CELL):
+        self.cell_size = cell_size
+        self._cells = {}
+        for x0, y0, x1, y1, text, block, line, word in words:
+            cx = (x0 + x1) / 2
+            cy = (y0 + y1) / 2
+            cell = (int(cx // cell_size), int(cy // cell_size))
+            self._cells.setdefault(cell, []).append((cx, cy, (block, line, word), text))
+
+    def text_in(self, rect):
+        """
+        Returns the words centred inside rect in reading order, words of a
+        text line joined by spaces and lines by newlines.
+        """
+        size = self.cell_size
+        hits = []
+        for gx in range(int(rect.x0 // size), int(rect.x1 // size) + 1):
+            for gy in range(int(rect.y0 // size), int(rect.y1 // size) + 1):
+                for cx, cy, order, text in self._cells.get((gx, gy), ()):
+                    if rect.x0 <= cx <= rect.x1 and rect.y0 <= cy <= rect.y1:
+                        hits.append((order, text))
+
+        hits.sort()
+        lines = []
+        current = None
+        for (block, line, _), text in hits:
+            if (block, line) != current:
+                lines.append([])
+                current = (block, line)
+            lines[-1].append(text)
+        return "\n".join(" ".join(words) for words in lines)
+
+
+def find_label(index, rect, left=LABEL_SEARCH_LEFT, above=LABEL_SEARCH_ABOVE):
+    """
+    Looks for a widget's label to its left, then above it.
+    Returns the label text or an empty string.
+    """
+    text = index.text_in(fitz.Rect(rect.x0 - left, rect.y0, rect.x0, rect.y1)).strip()
+    if not text:
+        text = index.text_in(fitz.Rect(rect.x0, rect.y0 - above, rect.x1, rect.y0)).strip()
+    return text
+
+
+def extract_page_fields(page):
+    """
+    Extracts the named widgets of one page with their labels.
     Returns list of dicts with field_name and label_text
     """
+    fields = []
+    index = None
+    for widget in page.widgets():
+        field_name = widget.field_name
+        if not field_name:
+            continue
+
+        # Text is only extracted for pages that have fields, once per page
+        if index is None:
+            index = WordIndex(page.get_text("words"))
+
+        label_text = find_label(index, widget.rect)
+        fields.append({
+            "field_name": field_name,
+            "label_text": label_text if label_text else field_name
+        })
+    return fields
+
+
+def open_document(source):
+    """
+    Opens a PDF from a file path (read on demand by MuPDF) or from bytes.
+    """
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def page_count(source):
+    doc = open_document(source)
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        fields = []
-        
-        for page in doc:
-            widgets = page.widgets()
-            if widgets:
-                for widget in widgets:
-                    field_name = widget.field_name
-                    if not field_name:
-                        continue
-                        
-                    # Attempt to find label text near the field
-                    rect = widget.rect
-                    # Search area: left of the field
-                    search_rect = fitz.Rect(rect.x0 - 150, rect.y0, rect.x0, rect.y1)
-                    text = page.get_text("text", clip=search_rect).strip()
-                    
-                    if not text:
-                        # Try above
-                        search_rect = fitz.Rect(rect.x0, rect.y0 - 20, rect.x1, rect.y0)
-                        text = page.get_text("text", clip=search_rect).strip()
-                    
-                    label_text = text if text else field_name
-                    
-                    fields.append({
-                        "field_name": field_name,
-                        "label_text": label_text
-                    })
-        
+        return len(doc)
+    finally:
         doc.close()
-        return fields
+
+
+def extract_fields_from_pages(source, start=0, stop=None):
+    """
+    Extracts fields and their labels from pages [start, stop), so large
+    documents can be split into page ranges processed in parallel.
+    Raises if the PDF cannot be read.
+    """
+    with metrics.span("extract_fields"):
+        doc = open_document(source)
+        try:
+            stop = len(doc) if stop is None else min(stop, len(doc))
+            fields = []
+            for page_num in range(start, stop):
+                fields.extend(extract_page_fields(doc[page_num]))
+            return fields
+        finally:
+            doc.close()
+
+
+def extract_fields_from_pdf(source):
+    """
+    Extracts fields and attempts to find their labels.
+    source is a file path (read on demand by MuPDF) or PDF bytes.
+    Returns list of dicts with field_name and label_text
+    """
+    try:
+        return extract_fields_from_pages(source)
     except Exception as e:
-        print(f"Error extracting PDF fields: {e}")
+        logger.error("Error extracting PDF fields: %s", e)
         return []
 
-def fill_pdf_fields(pdf_path, values):
+
+def diagnose_fields_from_pages(source, start=0, stop=None):
     """
-    Fills the PDF with the provided values using a hybrid approach:
+    Returns widget details (type, value, colours, font size) for every
+    widget on pages [start, stop).
+    """
+    doc = open_document(source)
+    try:
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        fields = []
+        for page_num in range(start, stop):
+            for widget in doc[page_num].widgets():
+                fields.append({
+                    "page": page_num + 1,
+                    "field_name": widget.field_name,
+                    "field_type": widget.field_type,
+                    "field_type_string": widget.field_type_string,
+                    "current_value": widget.field_value,
+                    "text_color": widget.text_color,
+                    "text_fontsize": widget.text_fontsize,
+                    "border_color": widget.border_color,
+                    "fill_color": widget.fill_color,
+                })
+        return fields
+    finally:
+        doc.close()
+
+def fill_pdf_fields(pdf_path, values, template_hash=None, save_profile="compact", fill_strategy=None):
+    """
+    Fills the PDF with the provided values using the template's fill
+    strategy (see FILL_STRATEGIES), or fill_strategy when given:
     1. Sets widget field values (for form functionality)
     2. Draws text directly on the page (for guaranteed visibility)
+    When template_hash is given the template is served from the parsed
+    template cache instead of being re-read and re-indexed from disk.
+    save_profile selects the output settings (see SAVE_PROFILES).
     Returns PDF bytes
     """
     try:
-        doc = fitz.open(pdf_path)
+        with metrics.span("template_load"):
+            if template_hash:
+                cached = template_cache.get(template_hash, pdf_path)
+                doc = fitz.open(stream=cached.pdf_bytes, filetype="pdf")
+                widget_index = cached.widget_index
+                strategy = fill_strategy or cached.fill_strategy
+            else:
+                plan = load_fill_plan(pdf_path) or build_fill_plan(pdf_path)
+                doc = fitz.open(pdf_path)
+                widget_index = plan.widget_index
+                strategy = fill_strategy or plan.fill_strategy
+
+        set_widgets = strategy in ("widget", "flatten", "hybrid")
+        draw_overlay = strategy in ("overlay", "hybrid")
+
+        # Only visit the widgets we have values for, in document order
+        refs = sorted(
+            (ref for field_name in values for ref in widget_index.get(field_name, ())),
+            key=lambda ref: ref.seq
+        )
+
         filled_count = 0
-        
-        for page_num, page in enumerate(doc):
-            widgets = page.widgets()
-            if widgets:
-                for widget in widgets:
-                    field_name = widget.field_name
-                    if field_name in values:
-                        value = str(values[field_name])
-                        
-                        # Get widget properties
-                        rect = widget.rect
-                        current_fontsize = widget.text_fontsize
-                        
-                        # Method 1: Set the field value (standard approach)
-                        widget.field_value = value
-                        
-                        # Fix font size if needed
-                        if not current_fontsize or current_fontsize == 0:
-                            widget.text_fontsize = 10  # Default readable size
-                            fontsize_to_use = 10
-                            print(f"  ⚠ Fixed font size from {current_fontsize} to 10 for '{field_name}'")
-                        else:
-                            widget.text_fontsize = current_fontsize
-                            fontsize_to_use = current_fontsize
-                        
-                        # Ensure text is visible
-                        widget.text_color = (0, 0, 0)  # Black text
-                        
-                        # Update the widget
-                        widget.update()
-                        
-                        # Method 2: ALSO draw text directly on the page (guaranteed visibility)
-                        # This ensures the text is visible even if widget appearance fails
-                        # Add small padding to position text nicely in the field
-                        text_x = rect.x0 + 2
-                        text_y = rect.y0 + (rect.height / 2) + (fontsize_to_use / 3)
-                        
-                        # Draw the text directly on the page
-                        page.insert_text(
-                            (text_x, text_y),
-                            value,
-                            fontsize=fontsize_to_use,
-                            color=(0, 0, 0),  # Black
-                            fontname="helv",  # Helvetica (built-in font)
-                        )
-                        
-                        filled_count += 1
-                        print(f"✓ Page {page_num + 1}: Filled '{field_name}' = '{value}' (fontsize: {fontsize_to_use}, drawn at {text_x:.1f}, {text_y:.1f})")
-        
+        pages = {}
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        with metrics.span("widget_fill"):
+            for ref in refs:
+                page = pages.get(ref.page)
+                if page is None:
+                    page = pages[ref.page] = doc[ref.page]
+                field_name = ref.field_name
+                value = str(values[field_name])
+                # Font size comes resolved from the fill plan (default if unset)
+                fontsize_to_use = ref.fontsize
+
+                if set_widgets:
+                    # Method 1: Set the field value (standard approach)
+                    widget = page.load_widget(ref.xref)
+                    widget.field_value = value
+                    widget.text_fontsize = fontsize_to_use
+
+                    # Ensure text is visible
+                    widget.text_color = (0, 0, 0)  # Black text
+
+                    # Update the widget
+                    widget.update()
+
+                text_x, text_y = ref.baseline
+                if draw_overlay:
+                    # Method 2: Draw text directly on the page, visible even
+                    # where the widget appearance cannot be generated
+                    page.insert_text(
+                        (text_x, text_y),
+                        value,
+                        fontsize=fontsize_to_use,
+                        color=(0, 0, 0),  # Black
+                        fontname="helv",  # Helvetica (built-in font)
+                    )
+
+                filled_count += 1
+                if debug:
+                    logger.debug(
+                        "Page %d: filled %r (%s, fontsize %s, at %.1f, %.1f)",
+                        ref.page + 1, field_name, strategy, fontsize_to_use, text_x, text_y
+                    )
+
+            if strategy == "flatten":
+                # Turn the filled widgets into static page content
+                doc.bake(annots=False, widgets=True)
+
         if filled_count == 0:
-            print(f"⚠ Warning: No fields were filled. Check if field names match.")
-            print(f"  Expected fields: {list(values.keys())}")
+            logger.warning("No fields were filled, check field names: %s", list(values.keys()))
         
-        # Save with proper settings
-        output_bytes = doc.tobytes(
-            garbage=4,  # Maximum garbage collection
-            deflate=True,  # Compress
-            clean=True  # Clean up unused objects
-        )
+        # Save with the selected profile's settings
+        with metrics.span("save"):
+            output_bytes = save_document(doc, save_profile)
         doc.close()
         
-        print(f"✓ Total fields filled: {filled_count}/{len(values)}")
-        print(f"✓ Text drawn directly on PDF for guaranteed visibility")
+        logger.info("Filled %d/%d fields", filled_count, len(values))
         return output_bytes
         
-    except Exception as e:
-        print(f"✗ Error filling PDF: {e}")
-        import traceback
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception("Error filling PDF")
         raise
-
-
-
-
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .. import models, schemas
+from ..instrumentation import metrics
+from .graph_service import group_mappings
+
+
+class ReadModelCache:
+    """
+    Per-template views derived from the database (e.g. the serialized
+    field list), built on first use and dropped by invalidate() whenever
+    the template's mappings or confirmation state change.
+
+    Each process has its own cache; the TTL bounds how stale a view can
+    get when another process made the change.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (view, template_id) -> (expires_at, value)
+        self._generations = {}  # template_id -> invalidation count
+        self._views = set()
+        self._lock = threading.Lock()
+
+    def get(self, view, template_id, build):
+        """
+        Returns the cached view, or build() it and cache the result.
+        build() returning None (e.g. unknown template) is not cached.
+        """
+        key = (view, template_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(template_id, 0)
+
+        value = build()
+        if value is None or self.ttl <= 0:
+            return value
+
+        with self._lock:
+            # Skip the store if the template changed while we were building
+            if self._generations.get(template_id, 0) == generation:
+                self._views.add(view)
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def peek(self, view, template_id):
+        """
+        Returns the cached view without building it, or None.
+        """
+        with self._lock:
+            entry = self._entries.get((view, template_id))
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end((view, template_id))
+            self.hits += 1
+            return entry[1]
+
+    def invalidate(self, template_id):
+        with self._lock:
+            self._generations[template_id] = self._generations.get(template_id, 0) + 1
+            for view in self._views:
+                self._entries.pop((view, template_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+read_models = ReadModelCache(
+    max_entries=int(os.getenv("READ_MODEL_MAX_ENTRIES", 10000)),
+    ttl=float(os.getenv("READ_MODEL_TTL", 60)),
+)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    True if an If-None-Match header value lists the given ETag (or *).
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def template_fields(db, template_id):
+    """
+    The GET /templates/{id}/fields response, serialized once per change.
+    Returns (json bytes, etag), or None if the template does not exist.
+    """
+    def build():
+        template = db.query(models.Template).filter(models.Template.id == template_id).first()
+        if not template:
+            return None
+        body = schemas.Template.model_validate(template).model_dump_json().encode()
+        return body, f'"{hashlib.sha256(body).hexdigest()}"'
+
+    return read_models.get("fields", template_id, build)
+
+
+def invalidate(template_id):
+    read_models.invalidate(template_id)
+
+
+def build_open_plan(db, template_id):
+    """
+    Loads a template and splits its fields into manual fields, unlocked
+    GraphDB fields and the locked GraphDB mappings to fetch, grouped by
+    entity for the graph query.
+    Returns None if the template does not exist.
+    """
+    with metrics.span("db_load"):
+        # Column-only queries: partitioning needs no ORM objects
+        template = db.query(
+            models.Template.id,
+            models.Template.template_name
+        ).filter(
+            models.Template.id == template_id
+        ).first()
+        
+        if not template:
+            return None
+        
+        mapping = models.FieldMapping
+        fields = db.query(
+            mapping.field_name,
+            mapping.label_text,
+            mapping.source,
+            mapping.entity_type,
+            mapping.property_name,
+            mapping.graph_path,
+            mapping.confirm_count,
+            mapping.is_locked
+        ).filter(
+            mapping.template_id == template_id
+        ).order_by(mapping.id).all()
+    
+    unlocked_graph_fields = []
+    manual_fields = []
+    graph_mappings_to_fetch = []
+    
+    for field in fields:
+        if field.source == "manual":
+            manual_fields.append({
+                "field_name": field.field_name,
+                "label_text": field.label_text
+            })
+            
+        elif field.source == "graphdb":
+            if field.is_locked:
+                graph_mappings_to_fetch.append({
+                    "entity_type": field.entity_type,
+                    "property_name": field.property_name,
+                    "graph_path": field.graph_path,
+                    "field_name": field.field_name
+                })
+            else:
+                unlocked_graph_fields.append({
+                    "field_name": field.field_name,
+                    "label_text": field.label_text,
+                    "confirm_count": field.confirm_count,
+                    "is_locked": False
+                })
+    
+    return {
+        "template_id": template.id,
+        "template_name": template.template_name,
+        "manual_fields": manual_fields,
+        "unlocked_graph_fields": unlocked_graph_fields,
+        "graph_mappings_to_fetch": graph_mappings_to_fetch,
+        "graph_fetch_groups": group_mappings(graph_mappings_to_fetch)
+    }
+
+
+def cached_open_plan(template_id):
+    """
+    The open plan if it is cached, without touching the database.
+    """
+    return read_models.peek("open", template_id)
+
+
+def open_plan(db, template_id):
+    """
+    The /forms/open plan of a template, built once per change.
+    Callers must not modify it.
+    """
+    return read_models.get("open", template_id, lambda: build_open_plan(db, template_id))
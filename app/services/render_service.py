@@ -0,0 +1,316 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from . import pdf_service
+from ..instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+class RenderPoolSaturated(Exception):
+    """
+    Raised when the render queue is full; callers should retry later.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Render pool is saturated")
+        self.retry_after = retry_after
+
+
+class RenderTimeout(Exception):
+    """
+    Raised when a render job does not finish within the job timeout.
+    """
+
+
+def _run_instrumented(fn, *args, **kwargs):
+    """
+    Pool-side job wrapper: returns the result together with the stage
+    timings recorded in the worker so the parent can merge them.
+    """
+    result = fn(*args, **kwargs)
+    return result, metrics.drain()
+
+
+class RenderEngine:
+    """
+    Runs CPU-bound PDF work (fills, field extraction) on a process pool.
+
+    At most `workers + max_pending` jobs are admitted at once; beyond that
+    submissions fail fast with RenderPoolSaturated instead of queueing
+    without bound. With workers=0 jobs run inline in the calling thread.
+    Documents of at least `parallel_min_pages` pages are split into one
+    page range per worker (0 disables splitting).
+    A pool broken by a dying worker (e.g. OOM-killed) fails the jobs it was
+    running and is replaced on the next submission.
+    """
+
+    def __init__(self, workers, max_pending, timeout, retry_after, parallel_min_pages=0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.parallel_min_pages = parallel_min_pages
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_pending)
+        self._in_flight = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process holding driver/DB threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """
+        Drops a broken pool so the next job spawns a fresh one.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts += 1
+        logger.error("Render pool broke (a worker died); starting a new one for the next job")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_to_pool(self, fn, *args, **kwargs):
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(_run_instrumented, fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # Broke since the last job finished: retry once on a fresh pool
+            self._discard_executor(executor)
+            executor = self._get_executor()
+            return executor, executor.submit(_run_instrumented, fn, *args, **kwargs)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Admits a job and returns a concurrent Future for its result.
+        The queue slot is released when the job actually finishes, so
+        timed-out jobs still count against the queue until they end.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise RenderPoolSaturated(self.retry_after)
+
+        try:
+            if self.workers > 0:
+                executor, job = self._submit_to_pool(fn, *args, **kwargs)
+                future = self._unwrap(executor, job)
+            else:
+                job = future = Future()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_flight += 1
+        job.add_done_callback(self._release)
+        return future
+
+    def _release(self, _):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _unwrap(self, executor, job):
+        """
+        Returns a future for the job's result, merging the worker's stage
+        timings on completion. Cancelling it cancels the pool job.
+        """
+        future = Future()
+
+        def on_job_done(job):
+            if job.cancelled():
+                future.cancel()
+                return
+            error = job.exception()
+            if isinstance(error, BrokenProcessPool):
+                self._discard_executor(executor)
+            if error is None:
+                result, stages = job.result()
+                metrics.merge(stages)
+            try:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            except InvalidStateError:
+                pass  # caller gave up (timeout) and cancelled
+
+        def on_cancel(future):
+            if future.cancelled():
+                job.cancel()
+
+        future.add_done_callback(on_cancel)
+        job.add_done_callback(on_job_done)
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Runs a job and blocks until it completes (for sync handlers).
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RenderTimeout(f"Render job exceeded {self.timeout}s")
+
+    async def run_async(self, fn, *args, **kwargs):
+        """
+        Runs a job without blocking the event loop.
+        """
+        if self.workers > 0:
+            future = self.submit(fn, *args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            future = await loop.run_in_executor(
+                None, functools.partial(self.submit, fn, *args, **kwargs)
+            )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise RenderTimeout(f"Render job exceeded {self.timeout}s")
+
+    def page_ranges(self, page_count):
+        """
+        Splits pages into contiguous (start, stop) ranges, one per worker,
+        or a single range below the parallel threshold.
+        """
+        if self.workers < 2 or self.parallel_min_pages <= 0 or page_count < self.parallel_min_pages:
+            return [(0, page_count)]
+
+        shards = min(self.workers, page_count)
+        size, extra = divmod(page_count, shards)
+        ranges = []
+        start = 0
+        for i in range(shards):
+            stop = start + size + (1 if i < extra else 0)
+            ranges.append((start, stop))
+            start = stop
+        return ranges
+
+    def _submit_ranges(self, fn, source, ranges):
+        futures = []
+        try:
+            for start, stop in ranges:
+                futures.append(self.submit(fn, source, start, stop))
+        except RenderPoolSaturated:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def run_pages(self, fn, source, page_count):
+        """
+        Runs fn(source, start, stop) over the page ranges of a document and
+        concatenates the per-range lists in page order.
+        """
+        futures = self._submit_ranges(fn, source, self.page_ranges(page_count))
+        deadline = time.monotonic() + self.timeout
+        results = []
+        try:
+            for future in futures:
+                results.extend(future.result(timeout=max(deadline - time.monotonic(), 0)))
+        except FutureTimeout:
+            for future in futures:
+                future.cancel()
+            raise RenderTimeout(f"Render job exceeded {self.timeout}s")
+        return results
+
+    async def run_pages_async(self, fn, source, page_count):
+        """
+        Like run_pages, without blocking the event loop.
+        """
+        ranges = self.page_ranges(page_count)
+        if len(ranges) == 1:
+            return await self.run_async(fn, source, 0, page_count)
+
+        futures = self._submit_ranges(fn, source, ranges)
+        try:
+            parts = await asyncio.wait_for(
+                asyncio.gather(*(asyncio.wrap_future(future) for future in futures)),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            for future in futures:
+                future.cancel()
+            raise RenderTimeout(f"Render job exceeded {self.timeout}s")
+        return [item for part in parts for item in part]
+
+    def fill(self, pdf_path, values, template_hash=None, save_profile="compact", fill_strategy=None):
+        return self.run(
+            pdf_service.fill_pdf_fields, pdf_path, values, template_hash, save_profile, fill_strategy
+        )
+
+    async def extract(self, source):
+        """
+        Extracts fields on the pool. Files large enough are split into
+        page ranges extracted in parallel; the result is the same as a
+        single serial pass.
+        """
+        if isinstance(source, str) and self.workers > 1 and self.parallel_min_pages > 0:
+            try:
+                page_count = await asyncio.to_thread(pdf_service.page_count, source)
+                if page_count >= self.parallel_min_pages:
+                    return await self.run_pages_async(
+                        pdf_service.extract_fields_from_pages, source, page_count
+                    )
+            except (RenderPoolSaturated, RenderTimeout):
+                raise
+            except Exception as e:
+                logger.error("Error extracting PDF fields: %s", e)
+                return []
+        return await self.run_async(pdf_service.extract_fields_from_pdf, source)
+
+    def diagnose(self, pdf_path):
+        """
+        Returns (page count, widget details) for a template file.
+        """
+        page_count = pdf_service.page_count(pdf_path)
+        return page_count, self.run_pages(pdf_service.diagnose_fields_from_pages, pdf_path, page_count)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "render_workers": self.workers,
+                "render_jobs_in_flight": self._in_flight,
+                "render_jobs_rejected": self._rejected,
+                "render_pool_restarts": self._restarts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_workers = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+
+render_engine = RenderEngine(
+    workers=_workers,
+    max_pending=int(os.getenv("RENDER_MAX_PENDING", 2 * max(_workers, 1))),
+    timeout=float(os.getenv("RENDER_TIMEOUT", 30)),
+    retry_after=int(os.getenv("RENDER_RETRY_AFTER", 5)),
+    parallel_min_pages=int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", 20)),
+)
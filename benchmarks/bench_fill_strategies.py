@@ -0,0 +1,54 @@
+"""
+Benchmark fill latency and output size for each fill strategy.
+
+Usage:
+    python -m benchmarks.bench_fill_strategies [--pages 4] [--widgets 40] [--fill 40]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.services import pdf_service
+from benchmarks.synthetic import make_form_pdf
+
+
+def run(pages, widgets, fill_count, iterations, save_profile):
+    pdf_bytes, field_names = make_form_pdf(pages, widgets)
+    values = {name: f"value {i}" for i, name in enumerate(field_names[:fill_count])}
+    report = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "template.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+        chosen = pdf_service.write_fill_plan(path)
+
+        for strategy in pdf_service.FILL_STRATEGIES:
+            fill = lambda: pdf_service.fill_pdf_fields(path, values, "bench", save_profile, strategy)
+            fill()  # warm the template cache
+            start = time.perf_counter()
+            for _ in range(iterations):
+                output = fill()
+            report[strategy] = ((time.perf_counter() - start) / iterations, len(output))
+
+    return chosen, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--widgets", type=int, default=40, help="widgets per page")
+    parser.add_argument("--fill", type=int, default=40, help="fields filled per submit")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--save-profile", default="fast", choices=list(pdf_service.SAVE_PROFILES))
+    args = parser.parse_args()
+
+    chosen, report = run(args.pages, args.widgets, args.fill, args.iterations, args.save_profile)
+    print(f"{args.pages} pages x {args.widgets} widgets, {args.fill} filled, auto-selected: {chosen}")
+    for strategy, (latency, size) in report.items():
+        print(f"  {strategy:<8} {latency * 1000:8.2f} ms/fill  {size:>9} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark concurrent form opens against a latency-injecting fake graph.
+
+Compares the sync GraphService on a worker thread pool (how sync handlers
+run) with AsyncGraphService driven from the event loop.
+
+Usage:
+    python -m benchmarks.bench_graph_concurrency [--requests 500] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.graph_service import AsyncGraphService, GraphService
+from benchmarks.bench_graph_fetch import ENTITIES, make_mappings
+from benchmarks.fakes import FakeAsyncDriver, FakeDriver
+
+
+def run_sync(mappings, graph_keys, requests, latency, threads):
+    svc = GraphService(driver=FakeDriver(latency=latency))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: svc.fetch_values(mappings, graph_keys), range(requests)))
+    return time.perf_counter() - start
+
+
+async def run_async(mappings, graph_keys, requests, latency, pool_size):
+    driver = FakeAsyncDriver(latency=latency, pool_size=pool_size)
+    svc = AsyncGraphService(driver=driver)
+    start = time.perf_counter()
+    await asyncio.gather(*(svc.fetch_values(mappings, graph_keys) for _ in range(requests)))
+    return time.perf_counter() - start, driver.peak_active
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--fields", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=40, help="sync worker threads (Starlette default: 40)")
+    parser.add_argument("--pool-size", type=int, default=100, help="async driver connection pool size")
+    args = parser.parse_args()
+
+    mappings = make_mappings(args.fields)
+    graph_keys = {f"{e.lower()}_id": f"{e[0]}1" for e in ENTITIES}
+
+    sync_elapsed = run_sync(mappings, graph_keys, args.requests, args.latency, args.threads)
+    async_elapsed, peak = asyncio.run(
+        run_async(mappings, graph_keys, args.requests, args.latency, args.pool_size)
+    )
+
+    print(f"{args.requests} opens, {args.latency * 1000:.0f} ms graph latency")
+    print(f"  sync  ({args.threads} threads)   {args.requests / sync_elapsed:9.1f} opens/s")
+    print(f"  async (pool {args.pool_size}, peak {peak})  {args.requests / async_elapsed:9.1f} opens/s")
+
+
+if __name__ == "__main__":
+    main()
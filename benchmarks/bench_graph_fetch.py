@@ -0,0 +1,83 @@
+"""
+Benchmark GraphService.fetch_values against a fake driver.
+
+Compares the per-field query loop with the batched single-query fetch,
+reporting Bolt round-trips and wall time per form open.
+
+Usage:
+    python -m benchmarks.bench_graph_fetch [--fields 60] [--latency 0.001]
+"""
+import argparse
+import time
+
+from app.services.graph_service import GraphService
+from benchmarks.fakes import FakeDriver
+
+ENTITIES = ["Person", "Parent", "Employee"]
+
+
+def make_mappings(field_count):
+    return [
+        {
+            "entity_type": ENTITIES[i % len(ENTITIES)],
+            "property_name": f"prop_{i}",
+            "field_name": f"field_{i}",
+        }
+        for i in range(field_count)
+    ]
+
+
+def per_field_fetch(driver, mappings, graph_keys):
+    """
+    The previous fetch path: one query per locked mapping.
+    """
+    results = {}
+    with driver.session() as session:
+        for m in mappings:
+            key_field = f"{m['entity_type'].lower()}_id"
+            if key_field not in graph_keys:
+                continue
+            query = f"MATCH (n:{m['entity_type']} {{id: $id}}) RETURN n.{m['property_name']} as val"
+            record = session.run(query, id=graph_keys[key_field]).single()
+            if record and record["val"]:
+                results[m["field_name"]] = record["val"]
+    return results
+
+
+def run(field_count, latency, iterations):
+    mappings = make_mappings(field_count)
+    graph_keys = {f"{e.lower()}_id": f"{e[0]}1" for e in ENTITIES}
+    report = {}
+
+    driver = FakeDriver(latency=latency)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        per_field_fetch(driver, mappings, graph_keys)
+    report["per_field"] = (driver.round_trips / iterations, time.perf_counter() - start)
+
+    driver = FakeDriver(latency=latency)
+    svc = GraphService(driver=driver)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        values = svc.fetch_values(mappings, graph_keys)
+    report["batched"] = (driver.round_trips / iterations, time.perf_counter() - start)
+    assert len(values) == field_count
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fields", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.001)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    report = run(args.fields, args.latency, args.iterations)
+    print(f"{args.fields} fields, {args.latency * 1000:.1f} ms simulated latency, {args.iterations} opens")
+    for name, (round_trips, elapsed) in report.items():
+        print(f"  {name:<10} {round_trips:>6.0f} round-trips/open  {elapsed / args.iterations * 1000:8.2f} ms/open")
+
+
+if __name__ == "__main__":
+    main()
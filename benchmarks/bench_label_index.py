@@ -0,0 +1,96 @@
+"""
+Benchmark label discovery: per-widget clipped text extraction versus the
+page word index used by extract_fields_from_pdf.
+
+Usage:
+    python -m benchmarks.bench_label_index [--pages 4] [--widgets 20 60 120]
+"""
+import argparse
+import time
+
+import fitz
+
+from app.services import pdf_service
+from benchmarks.synthetic import LABELS, make_form_pdf
+
+
+def clip_labels(doc):
+    """
+    The previous approach: up to two clipped get_text() passes per widget.
+    Returns {field_name: label}
+    """
+    labels = {}
+    for page in doc:
+        for widget in page.widgets():
+            if not widget.field_name:
+                continue
+            rect = widget.rect
+            search_rect = fitz.Rect(rect.x0 - 150, rect.y0, rect.x0, rect.y1)
+            text = page.get_text("text", clip=search_rect).strip()
+            if not text:
+                search_rect = fitz.Rect(rect.x0, rect.y0 - 20, rect.x1, rect.y0)
+                text = page.get_text("text", clip=search_rect).strip()
+            labels[widget.field_name] = text if text else widget.field_name
+    return labels
+
+
+def index_labels(doc):
+    labels = {}
+    for page in doc:
+        for field in pdf_service.extract_page_fields(page):
+            labels.setdefault(field["field_name"], field["label_text"])
+    return labels
+
+
+def first_line(text):
+    return " ".join(text.splitlines()[0].split()) if text.strip() else ""
+
+
+def correct(labels, field_names):
+    """
+    Counts fields whose label (first line, whitespace-normalized) is the
+    one make_form_pdf printed next to them. The clipped extraction also
+    picks up fragments of neighbouring glyphs on later lines, so only
+    the first line is compared.
+    """
+    return sum(
+        first_line(labels.get(name, "")) == LABELS[i % len(LABELS)]
+        for i, name in enumerate(field_names)
+    )
+
+
+def timed(fn, pdf_bytes, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        result = fn(doc)
+        doc.close()
+    return (time.perf_counter() - start) / iterations, result
+
+
+def run(pages, widgets, iterations):
+    pdf_bytes, field_names = make_form_pdf(pages, widgets)
+    clip_time, clipped = timed(clip_labels, pdf_bytes, iterations)
+    index_time, indexed = timed(index_labels, pdf_bytes, iterations)
+    return clip_time, index_time, correct(clipped, field_names), correct(indexed, field_names), len(field_names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--widgets", type=int, nargs="+", default=[20, 60, 120], help="widgets per page")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.pages} pages, {args.iterations} iterations")
+    for widgets in args.widgets:
+        clip_time, index_time, clip_ok, index_ok, total = run(args.pages, widgets, args.iterations)
+        print(
+            f"  {widgets:>4} widgets/page  clip {clip_time * 1000:8.2f} ms  "
+            f"index {index_time * 1000:8.2f} ms  ({clip_time / index_time:5.1f}x)  "
+            f"correct labels: clip {clip_ok}/{total}, index {index_ok}/{total}"
+        )
+
+
+if __name__ == "__main__":
+    main()
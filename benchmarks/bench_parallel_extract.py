@@ -0,0 +1,64 @@
+"""
+Benchmark serial versus page-range parallel field extraction.
+
+Usage:
+    python -m benchmarks.bench_parallel_extract [--pages 100] [--widgets 40] [--workers 4]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services import pdf_service
+from app.services.render_service import RenderEngine
+from benchmarks.synthetic import make_form_pdf
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations, result
+
+
+def run(pages, widgets, workers, iterations):
+    pdf_bytes, _ = make_form_pdf(pages, widgets)
+    engine = RenderEngine(
+        workers=workers, max_pending=workers, timeout=300, retry_after=1, parallel_min_pages=1
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "template.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+
+        try:
+            asyncio.run(engine.extract(path))  # start the worker processes
+            serial_time, serial = timed(lambda: pdf_service.extract_fields_from_pdf(path), iterations)
+            parallel_time, parallel = timed(lambda: asyncio.run(engine.extract(path)), iterations)
+        finally:
+            engine.shutdown()
+
+    return serial_time, parallel_time, serial == parallel, len(serial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--widgets", type=int, default=40, help="widgets per page")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    serial_time, parallel_time, identical, fields = run(
+        args.pages, args.widgets, args.workers, args.iterations
+    )
+    print(f"{args.pages} pages x {args.widgets} widgets ({fields} fields), {args.workers} workers")
+    print(f"  serial    {serial_time * 1000:8.1f} ms")
+    print(f"  parallel  {parallel_time * 1000:8.1f} ms  ({serial_time / parallel_time:4.1f}x)")
+    print(f"  identical output: {identical}")
+
+
+if __name__ == "__main__":
+    main()
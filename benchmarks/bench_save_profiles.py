@@ -0,0 +1,52 @@
+"""
+Benchmark fill latency and output size for each PDF save profile.
+
+Usage:
+    python -m benchmarks.bench_save_profiles [--pages 4] [--widgets 40] [--fill 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.services import pdf_service
+from benchmarks.synthetic import make_form_pdf
+
+
+def run(pages, widgets, fill_count, iterations):
+    pdf_bytes, field_names = make_form_pdf(pages, widgets)
+    values = {name: f"value {i}" for i, name in enumerate(field_names[:fill_count])}
+    report = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "template.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+
+        for profile in pdf_service.SAVE_PROFILES:
+            pdf_service.fill_pdf_fields(path, values, "bench", profile)  # warm the cache
+            start = time.perf_counter()
+            for _ in range(iterations):
+                output = pdf_service.fill_pdf_fields(path, values, "bench", profile)
+            elapsed = time.perf_counter() - start
+            report[profile] = (elapsed / iterations, len(output))
+
+    return len(pdf_bytes), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--widgets", type=int, default=40, help="widgets per page")
+    parser.add_argument("--fill", type=int, default=20, help="fields filled per submit")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    template_size, report = run(args.pages, args.widgets, args.fill, args.iterations)
+    print(f"{args.pages} pages x {args.widgets} widgets, {args.fill} filled, template {template_size} bytes")
+    for profile, (latency, size) in report.items():
+        print(f"  {profile:<9} {latency * 1000:8.2f} ms/fill  {size:>9} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark SQL statement count and latency of the mapping update endpoint.
+
+Compares the previous per-field SELECT loop with the current
+update_mapping (one load, one bulk UPDATE) on an in-memory SQLite DB.
+An executemany counts as a single statement.
+
+Usage:
+    python -m benchmarks.bench_update_mapping [--fields 300]
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas
+from app.database import Base
+from app.routers.templates import update_mapping
+from app.services import mapping_service
+from benchmarks.synthetic import LABELS
+
+
+def seed(session, field_count):
+    template = models.Template(tenant_id="bench", template_hash="bench", template_name="bench", file_path="")
+    session.add(template)
+    session.flush()
+    for i in range(field_count):
+        label = LABELS[i % len(LABELS)]
+        source, entity, prop = mapping_service.suggest_mapping(label)
+        session.add(models.FieldMapping(
+            template_id=template.id, field_name=f"field_{i}", label_text=label,
+            source=source, entity_type=entity, property_name=prop
+        ))
+    session.commit()
+    return template.id
+
+
+def per_field_update(template_id, mapping_update, db):
+    """
+    The previous implementation: one SELECT per updated field.
+    """
+    template = db.query(models.Template).filter(models.Template.id == template_id).first()
+    for change in mapping_update.fields:
+        field = db.query(models.FieldMapping).filter(
+            models.FieldMapping.template_id == template_id,
+            models.FieldMapping.field_name == change.field_name
+        ).first()
+        if field:
+            if change.source == "manual":
+                field.source, field.entity_type, field.property_name = "manual", None, None
+            else:
+                _, entity, prop = mapping_service.suggest_mapping(field.label_text)
+                field.source, field.entity_type, field.property_name = "graphdb", entity, prop
+            db.add(field)
+    db.commit()
+    db.refresh(template)
+    return template
+
+
+def measure(fn, field_count):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    template_id = seed(session, field_count)
+
+    # Flip every field that has a GraphDB rule to manual
+    mapping_update = schemas.MappingUpdate(fields=[
+        schemas.FieldUpdate(field_name=f"field_{i}", source="manual")
+        for i in range(field_count)
+    ])
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    start = time.perf_counter()
+    fn(template_id, mapping_update, session)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return len(statements), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fields", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"Updating {args.fields} field mappings")
+    for name, fn in (("per_field", per_field_update), ("bulk", update_mapping)):
+        count, elapsed = measure(fn, args.fields)
+        print(f"  {name:<10} {count:>5} SQL statements  {elapsed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
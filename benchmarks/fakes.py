@@ -0,0 +1,114 @@
+"""
+Local stand-ins for external services used by the benchmarks.
+"""
+import asyncio
+import time
+
+
+class FakeNode(dict):
+    """
+    Map projection stand-in: answers any property with a synthetic value.
+    """
+
+    def __init__(self, alias):
+        super().__init__()
+        self.alias = alias
+
+    def __bool__(self):
+        return True
+
+    def get(self, key, default=None):
+        return f"{self.alias}.{key}"
+
+
+class FakeRecord:
+    def __getitem__(self, key):
+        return FakeNode(key)
+
+
+class FakeResult:
+    def single(self):
+        return FakeRecord()
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        self.driver.round_trips += 1
+        if self.driver.latency:
+            time.sleep(self.driver.latency)
+        return FakeResult()
+
+
+class FakeDriver:
+    """
+    Neo4j driver stand-in that counts Bolt round-trips and can inject
+    a fixed per-query latency (seconds).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = 0
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def close(self):
+        pass
+
+
+class FakeAsyncResult:
+    async def single(self):
+        return FakeRecord()
+
+
+class FakeAsyncSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, parameters=None, **kwargs):
+        driver = self.driver
+        driver.round_trips += 1
+        async with driver.pool:
+            driver.active += 1
+            driver.peak_active = max(driver.peak_active, driver.active)
+            try:
+                if driver.latency:
+                    await asyncio.sleep(driver.latency)
+            finally:
+                driver.active -= 1
+        return FakeAsyncResult()
+
+
+class FakeAsyncDriver:
+    """
+    Async Neo4j driver stand-in with injected latency and a bounded
+    connection pool, tracking peak concurrent queries.
+    """
+
+    def __init__(self, latency=0.0, pool_size=100):
+        self.latency = latency
+        self.round_trips = 0
+        self.active = 0
+        self.peak_active = 0
+        self.pool = asyncio.Semaphore(pool_size)
+
+    def session(self, **kwargs):
+        return FakeAsyncSession(self)
+
+    async def close(self):
+        pass
@@ -0,0 +1,248 @@
+"""
+Run the benchmark suite and emit the results as JSON.
+
+Covers field extraction, mapping suggestion, PDF filling and graph
+fetches in isolation, then template upload, /forms/open and
+/forms/submit end to end through the app (in-process, on a scratch
+SQLite database with a fake Neo4j driver). With --graph-people, opens
+are served by an in-memory graph of that many people instead, each
+request looking up a different person.
+
+Usage:
+    python -m benchmarks.run_all [--pages 4] [--widgets 40] [--output results.json]
+    python -m benchmarks.run_all --graph-people 1000000
+    python -m benchmarks.run_all --compare baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import LABELS, make_form_pdf
+
+
+def measure(fn, iterations, warmup=1):
+    """
+    Times `iterations` calls of fn. Returns a summary in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    total = sum(samples)
+    return {
+        "iterations": iterations,
+        "mean_ms": total / iterations,
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[min(int(iterations * 0.95), iterations - 1)],
+        "ops_per_sec": iterations / (total / 1000) if total else None,
+    }
+
+
+def bench_components(args, pdf_bytes, field_names):
+    from app.services import mapping_service, pdf_service
+    from app.services.graph_service import GraphService
+    from benchmarks.bench_graph_fetch import ENTITIES, make_mappings
+    from benchmarks.fakes import FakeDriver
+
+    results = {}
+
+    results["extract_fields"] = measure(
+        lambda: pdf_service.extract_fields_from_pdf(pdf_bytes), args.iterations
+    )
+
+    labels = [f"{LABELS[i % len(LABELS)]} {i}" for i in range(len(field_names))]
+    results["suggest_mapping"] = measure(
+        lambda: [mapping_service.suggest_mapping(label) for label in labels], args.iterations
+    )
+    results["suggest_mapping"]["labels"] = len(labels)
+
+    path = os.path.join("uploaded_pdfs", "bench_component.pdf")
+    with open(path, "wb") as f:
+        f.write(pdf_bytes)
+    values = {name: f"value {i}" for i, name in enumerate(field_names[:args.fill])}
+    results["fill_pdf_fields"] = measure(
+        lambda: pdf_service.fill_pdf_fields(path, values, "bench_component"), args.iterations
+    )
+    results["fill_pdf_fields"]["fields_filled"] = len(values)
+
+    mappings = make_mappings(args.graph_fields)
+    graph_keys = {f"{entity.lower()}_id": f"{entity[0]}1" for entity in ENTITIES}
+    svc = GraphService(driver=FakeDriver(latency=args.latency))
+    results["graph_fetch_values"] = measure(
+        lambda: svc.fetch_values(mappings, graph_keys), args.iterations
+    )
+    results["graph_fetch_values"]["latency_ms"] = args.latency * 1000
+
+    return results
+
+
+def bench_endpoints(args, pdf_bytes, field_names):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import update
+
+    from app import models
+    from app.database import SessionLocal
+    from app.main import app
+    from app.routers import forms
+    from app.services.graph_service import AsyncGraphService
+    from app.services.memory_graph import MemoryGraph
+    from benchmarks.fakes import FakeAsyncDriver
+    from benchmarks.synthetic import write_graph_fixture
+
+    results = {}
+    if args.graph_people:
+        graph = MemoryGraph(latency=args.latency)
+        start = time.perf_counter()
+        for path in write_graph_fixture(os.getcwd(), args.graph_people):
+            graph.load(path)
+        results["graph_load"] = {"seconds": time.perf_counter() - start, **graph.stats()}
+        forms.graph_svc = AsyncGraphService(backend=graph)
+    else:
+        forms.graph_svc = AsyncGraphService(driver=FakeAsyncDriver(latency=args.latency))
+
+    with TestClient(app) as client:
+        uploads = itertools.count()
+
+        def upload():
+            # A new tenant per upload, so every request runs the full ingest
+            response = client.post(
+                "/templates/?wait=true",
+                files={"file": ("bench.pdf", pdf_bytes, "application/pdf")},
+                data={"tenant_id": f"bench_{next(uploads)}"},
+            )
+            response.raise_for_status()
+            return response
+
+        results["upload_template"] = measure(upload, args.iterations)
+        template_id = upload().json()["id"]
+
+        # Lock the GraphDB fields so opens go through the graph fetch
+        db = SessionLocal()
+        db.execute(
+            update(models.FieldMapping)
+            .where(models.FieldMapping.template_id == template_id, models.FieldMapping.source == "graphdb")
+            .values(is_locked=True)
+        )
+        db.commit()
+        db.close()
+
+        open_body = {
+            "template_id": template_id,
+            "graph_keys": {"person_id": "P1", "parent_id": "Q1", "employee_id": "E1"},
+        }
+        people = random.Random(0)
+
+        def open_form():
+            body = open_body
+            if args.graph_people:
+                i = people.randrange(args.graph_people)
+                body = {**open_body, "graph_keys": {"person_id": f"P{i}", "parent_id": f"Q{i}", "employee_id": f"E{i}"}}
+            client.post("/forms/open", json=body).raise_for_status()
+
+        results["forms_open"] = measure(open_form, args.requests)
+
+        submit_body = {
+            **open_body,
+            "final_values": {name: f"value {i}" for i, name in enumerate(field_names[:args.fill])},
+        }
+        results["forms_submit"] = measure(
+            lambda: client.post("/forms/submit", json=submit_body).raise_for_status(), args.requests
+        )
+
+    return results
+
+
+def compare(results, baseline):
+    """
+    Returns {benchmark: current mean / baseline mean}; above 1 is slower.
+    """
+    ratios = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and previous.get("mean_ms"):
+            ratios[name] = round(current["mean_ms"] / previous["mean_ms"], 3)
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--widgets", type=int, default=40, help="widgets per page")
+    parser.add_argument("--label-density", type=float, default=1.0)
+    parser.add_argument("--fill", type=int, default=20, help="fields filled per submit")
+    parser.add_argument("--graph-fields", type=int, default=60, help="locked mappings per graph fetch")
+    parser.add_argument("--latency", type=float, default=0.001, help="fake Neo4j latency (seconds)")
+    parser.add_argument("--graph-people", type=int, default=0,
+                        help="serve opens from an in-memory graph of this many people (0 uses the fake driver)")
+    parser.add_argument("--iterations", type=int, default=10, help="runs per component benchmark")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint benchmark")
+    parser.add_argument("--workers", type=int, default=0, help="render workers (0 renders inline)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Scratch database and upload directory, set before the app is imported
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="pdf_bench_")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "RENDER_WORKERS": str(args.workers),
+        "OUTPUT_CACHE_MAX_BYTES": "0",
+        "GRAPH_CACHE_TTL": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    pdf_bytes, field_names = make_form_pdf(args.pages, args.widgets, args.label_density)
+    from app.routers import templates  # noqa: F401 - creates uploaded_pdfs/
+
+    try:
+        results = bench_components(args, pdf_bytes, field_names)
+        results.update(bench_endpoints(args, pdf_bytes, field_names))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "template_bytes": len(pdf_bytes),
+            "template_fields": len(field_names),
+        },
+        "results": results,
+    }
+    if baseline is not None:
+        report["compare"] = compare(results, baseline)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Synthetic fillable PDFs and graph fixtures for benchmarks.
+"""
+import csv
+import os
+
+import fitz
+
+LABELS = [
+    "FIRST NAME", "LAST NAME", "EMAIL ADDRESS", "PHONE NUMBER", "ID NUMBER",
+    "STREET ADDRESS", "PARENT NAME", "PARENT ADDRESS", "EMPLOYEE ID", "COMMENTS",
+]
+
+
+def make_form_pdf(pages=1, widgets_per_page=20, label_density=1.0):
+    """
+    Builds a PDF with `widgets_per_page` text fields per page laid out in
+    two columns. A `label_density` fraction of the fields get a printed
+    label to their left; filler text is added in proportion.
+    Returns (pdf_bytes, field_names).
+    """
+    doc = fitz.open()
+    field_names = []
+    rows = (widgets_per_page + 1) // 2
+    row_height = min(36, 700 / max(rows, 1))
+
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 30), f"Synthetic form - page {page_num + 1}", fontsize=12)
+
+        for i in range(widgets_per_page):
+            column, row = divmod(i, rows)
+            x = 40 + column * 280
+            y = 50 + row * row_height
+            n = len(field_names)
+
+            if (i * label_density) % 1 < label_density or label_density >= 1:
+                page.insert_text((x, y + 10), LABELS[n % len(LABELS)], fontsize=8)
+                page.insert_text((x, y + row_height - 4), "please print clearly", fontsize=5)
+
+            widget = fitz.Widget()
+            widget.field_name = f"field_{n}"
+            widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+            widget.rect = fitz.Rect(x + 110, y, x + 260, y + min(16, row_height - 2))
+            page.add_widget(widget)
+            field_names.append(widget.field_name)
+
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes, field_names
+
+
+def write_graph_fixture(directory, people):
+    """
+    Writes a graph fixture for MemoryGraph: `people` Person nodes, each
+    with a Parent (CHILD_OF) and an Employee record (EMPLOYED_AS), keyed
+    P{i}, Q{i} and E{i}. Returns the [nodes, relationships] CSV paths.
+    """
+    nodes_path = os.path.join(directory, "graph_nodes.csv")
+    rels_path = os.path.join(directory, "graph_relationships.csv")
+
+    with open(nodes_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["label", "id", "first_name", "last_name", "email", "phone", "address",
+                         "id_number", "name", "employee_id"])
+        for i in range(people):
+            writer.writerow(["Person", f"P{i}", f"First{i}", f"Last{i}", f"person{i}@example.com",
+                             f"+1-555-{i:07d}", f"{i} Main Street", f"ID{i:09d}", "", ""])
+            writer.writerow(["Parent", f"Q{i}", "", "", "", "", f"{i} Oak Avenue", "", f"Parent {i}", ""])
+            writer.writerow(["Employee", f"E{i}", "", "", "", "", "", "", "", f"EMP-{i:07d}"])
+
+    with open(rels_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["start_label", "start_id", "type", "end_label", "end_id"])
+        for i in range(people):
+            writer.writerow(["Person", f"P{i}", "CHILD_OF", "Parent", f"Q{i}"])
+            writer.writerow(["Person", f"P{i}", "EMPLOYED_AS", "Employee", f"E{i}"])
+
+    return [nodes_path, rels_path]
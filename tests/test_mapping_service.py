@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from app.services import mapping_service
+from app.services.mapping_service import DEFAULT_RULES, LabelMatcher
+
+
+@pytest.fixture
+def matcher():
+    return LabelMatcher(DEFAULT_RULES)
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("FIRST NAME", ("graphdb", "Person", "first_name")),
+    ("  email  ", ("graphdb", "Person", "email")),
+    ("COMMENTS", ("manual", None, None)),
+    # The first rule in dict order used to win; now the longest one does
+    ("EMPLOYEE ID NUMBER", ("graphdb", "Employee", "employee_id")),
+    ("PARENT ADDRESS LINE", ("graphdb", "Parent", "address")),
+    ("STUDENT PARENT NAME", ("graphdb", "Parent", "name")),
+    ("HOME STREET ADDRESS 2", ("graphdb", "Person", "address")),
+    ("MOBILE PHONE NUMBER", ("graphdb", "Person", "phone")),
+])
+def test_longest_contained_rule_wins(matcher, label, expected):
+    assert matcher.match(label) == expected
+
+
+def test_exact_match_beats_longer_contained_rule():
+    matcher = LabelMatcher({"ID": ("Person", "id_number"), "ID ID ID": ("Other", "x")})
+    assert matcher.match("ID") == ("graphdb", "Person", "id_number")
+    assert matcher.match("ID ID ID ID") == ("graphdb", "Other", "x")
+
+
+def test_tenant_rules_override_defaults(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapping_service, "_tenant_matchers", {})
+    (tmp_path / "acme.json").write_text(json.dumps({
+        "ADDRESS": ["Company", "address"],
+        "STUDENT ID": ["Student", "student_id"],
+    }))
+    (tmp_path / "broken.json").write_text("{not json")
+
+    assert mapping_service.load_rules_dir(str(tmp_path)) == 1
+    assert mapping_service.suggest_mappings(["ADDRESS", "STUDENT ID", "EMAIL"], tenant_id="acme") == [
+        ("graphdb", "Company", "address"),
+        ("graphdb", "Student", "student_id"),
+        ("graphdb", "Person", "email"),
+    ]
+    assert mapping_service.suggest_mapping("ADDRESS", tenant_id="other") == ("graphdb", "Person", "address")